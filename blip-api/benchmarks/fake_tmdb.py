@@ -0,0 +1,123 @@
+"""Local stand-in for the TMDB API, serving the deterministic fixtures of benchmarks.fixtures.
+
+Usage (from blip-api/):
+    python -m benchmarks.fake_tmdb --port 8100 --movies 100000 --latency-ms 80 --jitter-ms 40 --error-rate 0.01
+    TMDB_URL=http://localhost:8100 flask --app src.app run  # the API under test
+
+GET /__stats returns the number of requests served per endpoint, POST /__reset sets them back to zero.
+"""
+import argparse
+import asyncio
+import random
+from collections import Counter
+
+from aiohttp import web
+
+from benchmarks import fixtures
+
+
+@web.middleware
+async def simulate_network(request, handler):
+    config = request.app['config']
+    if request.path.startswith('/__'):
+        return await handler(request)
+
+    resource = request.match_info.route.resource
+    request.app['stats'][resource.canonical if resource else 'unmatched'] += 1
+    delay = max(0.0, random.gauss(config.latency_ms, config.jitter_ms)) / 1000
+    await asyncio.sleep(delay)
+    roll = random.random()
+    if roll < config.rate_limit_rate:
+        return web.json_response({'status_code': 25, 'status_message': 'Rate limited'}, status=429,
+                                 headers={'Retry-After': '1'})
+    if roll < config.rate_limit_rate + config.error_rate:
+        return web.json_response({'status_code': 11, 'status_message': 'Internal error'}, status=500)
+    return await handler(request)
+
+
+def movie_id_or_404(request):
+    movie_id = int(request.match_info['movie_id'])
+    if not 1 <= movie_id <= request.app['config'].movies:
+        raise web.HTTPNotFound(text='{"status_code": 34, "status_message": "Not found"}',
+                               content_type='application/json')
+    return movie_id
+
+
+async def movie_details(request):
+    movie_id = movie_id_or_404(request)
+    details = fixtures.movie_details_json(movie_id)
+    appended = {
+        'videos': lambda: fixtures.videos_json(movie_id),
+        'watch/providers': lambda: fixtures.watch_providers_json(movie_id),
+        'keywords': lambda: fixtures.keywords_json(movie_id),
+        'recommendations': lambda: fixtures.recommendations_json(movie_id, request.app['config'].movies),
+    }
+    for name in request.query.get('append_to_response', '').split(','):
+        if name in appended:
+            details[name] = appended[name]()
+    return web.json_response(details)
+
+
+async def movie_recommendations(request):
+    movie_id = movie_id_or_404(request)
+    return web.json_response(fixtures.recommendations_json(movie_id, request.app['config'].movies))
+
+
+async def movie_videos(request):
+    return web.json_response(fixtures.videos_json(movie_id_or_404(request)))
+
+
+async def movie_watch_providers(request):
+    return web.json_response(fixtures.watch_providers_json(movie_id_or_404(request)))
+
+
+async def discover_movies(request):
+    provider_ids = {int(provider_id) for provider_id in request.query.get('with_watch_providers', '').split('|')
+                    if provider_id}
+    page = int(request.query.get('page', 1))
+    return web.json_response(fixtures.discover_json(page, request.app['config'].movies,
+                                                    request.query.get('watch_region'), provider_ids))
+
+
+async def watch_providers(request):
+    return web.json_response(fixtures.providers_json())
+
+
+async def stats(request):
+    return web.json_response(dict(request.app['stats']))
+
+
+async def reset_stats(request):
+    request.app['stats'].clear()
+    return web.json_response({})
+
+
+def create_app(config):
+    app = web.Application(middlewares=[simulate_network])
+    app['config'] = config
+    app['stats'] = Counter()
+    app.router.add_get('/3/movie/{movie_id:\\d+}', movie_details)
+    app.router.add_get('/3/movie/{movie_id:\\d+}/recommendations', movie_recommendations)
+    app.router.add_get('/3/movie/{movie_id:\\d+}/videos', movie_videos)
+    app.router.add_get('/3/movie/{movie_id:\\d+}/watch/providers', movie_watch_providers)
+    app.router.add_get('/3/discover/movie', discover_movies)
+    app.router.add_get('/3/watch/providers/movie', watch_providers)
+    app.router.add_get('/__stats', stats)
+    app.router.add_post('/__reset', reset_stats)
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--movies', type=int, default=100000, help='Catalog size, other ids are 404')
+    parser.add_argument('--latency-ms', type=float, default=80)
+    parser.add_argument('--jitter-ms', type=float, default=30)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with a 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Share of requests answered with a 429')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    web.run_app(create_app(args), host=args.host, port=args.port)
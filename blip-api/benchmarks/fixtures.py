@@ -0,0 +1,111 @@
+"""Deterministic TMDB-like data shared by the fake TMDB server and the database seeder.
+
+Every movie id from 1 to the catalog size has the same details, videos, watch providers and recommendations
+in both, movie 1 being the most popular.
+"""
+import random
+from functools import lru_cache
+
+from benchmarks.utils import GENRES, LANGUAGES
+
+PROVIDERS = [(8, 'Netflix'), (119, 'Amazon Prime Video'), (337, 'Disney Plus'), (381, 'Canal+'),
+             (350, 'Apple TV Plus'), (531, 'Paramount Plus'), (1899, 'Max'), (283, 'Crunchyroll')]
+REGIONS = ['FR', 'US', 'GB', 'DE', 'ES']
+RESULTS_PER_PAGE = 20
+
+
+def popularity(movie_id):
+    return round(10000 / movie_id ** 0.7, 3)
+
+
+def watch_providers(movie_id):
+    # {region: [provider_id]}, a third of the movies are on no flatrate provider in a region
+    rng = random.Random(f"providers-{movie_id}")
+    return {region: [provider_id for provider_id, _ in rng.sample(PROVIDERS, rng.choice([0, 1, 1, 2, 3]))]
+            for region in REGIONS}
+
+
+def watch_providers_json(movie_id):
+    return {'id': movie_id, 'results': {
+        region: {'link': f"https://www.themoviedb.org/movie/{movie_id}/watch?locale={region}",
+                 'flatrate': [{'provider_id': provider_id, 'provider_name': dict(PROVIDERS)[provider_id]}
+                              for provider_id in provider_ids]}
+        for region, provider_ids in watch_providers(movie_id).items()}}
+
+
+def videos_json(movie_id):
+    rng = random.Random(f"videos-{movie_id}")
+    results = [{'key': f"teaser{movie_id}", 'site': 'YouTube', 'type': 'Teaser'}]
+    if rng.random() < 0.8:
+        results.append({'key': f"trailer{movie_id}", 'site': 'YouTube', 'type': 'Trailer'})
+    return {'id': movie_id, 'results': results}
+
+
+def keywords_json(movie_id):
+    rng = random.Random(f"keywords-{movie_id}")
+    return {'id': movie_id, 'keywords': [{'id': keyword_id, 'name': f"keyword {keyword_id}"}
+                                         for keyword_id in rng.sample(range(1, 5000), rng.randint(0, 10))]}
+
+
+def recommendations_json(movie_id, catalog_size):
+    rng = random.Random(f"recommendations-{movie_id}")
+    movie_ids = rng.sample(range(1, catalog_size + 1), min(RESULTS_PER_PAGE, catalog_size))
+    return {'page': 1, 'results': [movie_summary(recommended_id) for recommended_id in movie_ids],
+            'total_pages': 1, 'total_results': len(movie_ids)}
+
+
+def movie_summary(movie_id):
+    return {'id': movie_id, 'title': f"Movie {movie_id}", 'popularity': popularity(movie_id)}
+
+
+def movie_details_json(movie_id):
+    rng = random.Random(f"details-{movie_id}")
+    return {
+        'id': movie_id,
+        'title': f"Movie {movie_id}",
+        'original_title': f"Movie {movie_id}",
+        'vote_average': round(rng.uniform(2, 9), 1),
+        'vote_count': rng.randint(0, 30000),
+        'status': 'Released',
+        'release_date': f"{rng.randint(1950, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        'revenue': rng.randint(0, 10 ** 9),
+        'runtime': rng.randint(70, 180),
+        'adult': False,
+        'backdrop_path': f"/backdrop{movie_id}.jpg",
+        'budget': rng.randint(0, 3 * 10 ** 8),
+        'homepage': '',
+        'imdb_id': f"tt{movie_id:07d}",
+        'original_language': rng.choice(LANGUAGES),
+        'overview': f"Overview of movie {movie_id}. " * rng.randint(2, 8),
+        'popularity': popularity(movie_id),
+        # A few movies have no poster, like on TMDB
+        'poster_path': f"/poster{movie_id}.jpg" if rng.random() < 0.95 else None,
+        'tagline': '',
+        'genres': [{'id': i, 'name': genre} for i, genre in enumerate(rng.sample(GENRES, rng.randint(1, 3)))],
+        'production_companies': [{'id': rng.randint(1, 1000), 'name': 'Studio'}],
+        'production_countries': [{'iso_3166_1': 'US', 'name': 'United States of America'}],
+        'spoken_languages': [{'iso_639_1': 'en', 'name': 'English'}],
+    }
+
+
+@lru_cache(maxsize=256)
+def discover_movie_ids(catalog_size, region=None, provider_ids=None):
+    if not provider_ids:
+        return range(1, catalog_size + 1)
+    return [movie_id for movie_id in range(1, catalog_size + 1)
+            if set(provider_ids).intersection(watch_providers(movie_id).get(region, []))]
+
+
+def discover_json(page, catalog_size, region=None, provider_ids=None):
+    # Movies by popularity, filtered by flatrate availability like TMDB /discover/movie
+    movie_ids = discover_movie_ids(catalog_size, region, tuple(sorted(provider_ids or [])))
+    start = (page - 1) * RESULTS_PER_PAGE
+    return {'page': page,
+            'results': [movie_summary(movie_id) for movie_id in movie_ids[start:start + RESULTS_PER_PAGE]],
+            'total_pages': (len(movie_ids) + RESULTS_PER_PAGE - 1) // RESULTS_PER_PAGE,
+            'total_results': len(movie_ids)}
+
+
+def providers_json():
+    return {'results': [{'provider_id': provider_id, 'provider_name': provider_name}
+                        for provider_id, provider_name in PROVIDERS]}
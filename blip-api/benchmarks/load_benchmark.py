@@ -0,0 +1,99 @@
+"""Load scenarios against a running API backed by the fake TMDB server and a seeded database.
+
+Usage (from blip-api/):
+    python -m benchmarks.fake_tmdb --movies 100000 &
+    TMDB_URL=http://localhost:8100 python -m src.app &
+    python -m benchmarks.load_benchmark --users 1000 --requests 300 --concurrency 16 --cold
+
+--cold flushes the Redis database of the API (REDIS_HOST / REDIS_PORT) before the first pass, the second pass
+replays the same requests on warm caches. Restart the API to also drop its in-process caches, and seed again
+to get back the movies stored by a previous run. TMDB calls per request include the background work (refresh
+queue, feed prefetch) started during the pass.
+"""
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import redis
+import requests
+
+from benchmarks.utils import report
+
+SCENARIOS = ['discover', 'watchlist', 'opinion']
+
+
+def discover_request(session, args, rng):
+    params = {'user_id': rng.randint(1, args.users), 'locale': 'FR'}
+    if rng.random() < 0.5:
+        params['platforms'] = rng.choice(['Netflix', 'Netflix,Disney Plus', 'Amazon Prime Video', 'Canal+'])
+    return session.get(f"{args.api_url}/discover-movies", params=params, timeout=60)
+
+
+def watchlist_request(session, args, rng):
+    params = {'opinion': rng.choice([1, 3])} if rng.random() < 0.5 else {}
+    return session.get(f"{args.api_url}/user/{rng.randint(1, args.users)}/movies", params=params, timeout=60)
+
+
+def opinion_request(session, args, rng):
+    data = {'movie_id': rng.randint(1, args.movies), 'opinion': rng.randint(1, 4)}
+    return session.post(f"{args.api_url}/user/{rng.randint(1, args.users)}/movie", json=data, timeout=60)
+
+
+REQUESTS = {'discover': discover_request, 'watchlist': watchlist_request, 'opinion': opinion_request}
+
+
+def tmdb_calls(args):
+    return sum(requests.get(f"{args.tmdb_url}/__stats", timeout=5).json().values())
+
+
+def run_scenario(scenario, args, seed):
+    # The same seed replays the same requests
+    rngs = [random.Random(f"{seed}-{i}") for i in range(args.requests)]
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+
+    def timed_request(rng):
+        start = time.perf_counter()
+        try:
+            ok = REQUESTS[scenario](session, args, rng).status_code < 500
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    tmdb_calls_before = tmdb_calls(args)
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(timed_request, rngs))
+    # Let the background work started by the pass reach TMDB before counting
+    time.sleep(args.settle_seconds)
+    calls_per_request = (tmdb_calls(args) - tmdb_calls_before) / args.requests
+
+    durations = [duration for duration, _ in results]
+    errors = sum(not ok for _, ok in results)
+    return durations, f" | {calls_per_request:6.2f} TMDB calls/request | {errors} errors"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--api-url', default='http://localhost:5001')
+    parser.add_argument('--tmdb-url', default='http://localhost:8100', help='Fake TMDB server used by the API')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--users', type=int, default=1000, help='Seeded users')
+    parser.add_argument('--movies', type=int, default=100000, help='Catalog size of the fake TMDB server')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per scenario and pass')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--settle-seconds', type=float, default=2)
+    parser.add_argument('--cold', action='store_true', help='Flush the Redis database of the API first')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.cold:
+        redis.Redis(host=os.getenv('REDIS_HOST', 'localhost'), port=int(os.getenv('REDIS_PORT', 6379))).flushdb()
+
+    for cache in ('cold' if args.cold else 'first', 'warm'):
+        for scenario in args.scenarios.split(','):
+            # Opinions are new on every pass, the other scenarios replay the same requests
+            seed = f"{args.seed}-{scenario}" + (f"-{cache}" if scenario == 'opinion' else '')
+            durations, extra = run_scenario(scenario, args, seed)
+            report(f"{scenario} ({cache})", durations, extra)
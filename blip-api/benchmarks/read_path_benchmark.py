@@ -0,0 +1,151 @@
+"""Compare the movie read path (Core columns, MovieRecord, orjson) with loading whole TmdbMovie ORM instances.
+
+Usage (from blip-api/):
+    python -m benchmarks.read_path_benchmark --movies 5000 --batch 20  # in-memory SQLite filled from the fixtures
+    DATABASE_URI=postgresql://localhost/blip_bench python -m benchmarks.read_path_benchmark --seeded
+
+Each path loads batches of stored movies, builds their payloads and serializes them, like a discover deck or a
+watchlist page missing the movie cache. CPU is process time per movie, memory is the peak allocated per batch
+and the size kept per loaded movie.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import time
+import tracemalloc
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+
+from benchmarks import fixtures
+from benchmarks.utils import report
+
+
+@compiles(JSONB, 'sqlite')
+def compile_jsonb_sqlite(type_, compiler, **kw):
+    return 'JSON'
+
+
+def orm_payloads(movie_ids):
+    # The read path before MovieRecord: whole ORM instances, genres split for every payload
+    from src.database import db
+    from src.database.models import TmdbMovie
+
+    movies = db.session.query(TmdbMovie).filter(TmdbMovie.id.in_(movie_ids)).all()
+    for movie in movies:
+        db.session.expunge(movie)
+    payloads = [{
+        "id": movie.id,
+        "title": movie.title,
+        "image": f"https://image.tmdb.org/t/p/w500{movie.poster_path}",
+        "date": movie.release_date.split('-')[0] if movie.release_date else 'N/A',
+        "rate": movie.vote_average,
+        "overview": movie.overview,
+        "trailer_key": movie.trailer_key,
+        "runtime": movie.runtime if movie.runtime else 'N/A',
+        "genres": [genre.strip() for genre in movie.genres.split(',')],
+        "platforms": []
+    } for movie in movies]
+    return movies, json.dumps(payloads)
+
+
+def record_payloads(movie_ids):
+    from src.services.serialization import dumps
+    from src.services.tmdb import enrich_movie, get_stored_movies
+
+    movies = list(get_stored_movies(movie_ids).values())
+    return movies, dumps([enrich_movie(movie) for movie in movies])
+
+
+PATHS = {'orm': orm_payloads, 'record': record_payloads}
+
+
+def fill_sqlite(movies):
+    from src.database import db
+    from src.database.models import TmdbMovie
+    from src.services.tmdb import movie_fields
+
+    db.create_all()
+    today = datetime.now().date()
+    rows = []
+    for movie_id in range(1, movies + 1):
+        details = fixtures.movie_details_json(movie_id)
+        details['videos'] = fixtures.videos_json(movie_id)
+        details['keywords'] = fixtures.keywords_json(movie_id)
+        rows.append(movie_fields(details, today))
+    db.session.execute(TmdbMovie.__table__.insert(), rows)
+    db.session.commit()
+
+
+def stored_movie_ids(limit):
+    from src.database import db
+    from src.database.models import TmdbMovie
+
+    return list(db.session.scalars(select(TmdbMovie.id).order_by(TmdbMovie.popularity.desc()).limit(limit)))
+
+
+def benchmark_path(name, movie_ids, args):
+    from src.database import db
+
+    rng = random.Random(args.seed)
+    batches = [rng.sample(movie_ids, args.batch) for _ in range(args.runs)]
+    for batch in batches[:10]:
+        PATHS[name](batch)
+        db.session.remove()
+
+    durations = []
+    cpu_start = time.process_time()
+    for batch in batches:
+        start = time.perf_counter()
+        PATHS[name](batch)
+        durations.append(time.perf_counter() - start)
+        db.session.remove()
+    cpu_per_movie = (time.process_time() - cpu_start) / (len(batches) * args.batch) * 1e6
+
+    gc.collect()
+    tracemalloc.start()
+    PATHS[name](batches[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.session.remove()
+
+    # Size kept per movie while a request holds the loaded movies
+    retained_ids = movie_ids[:args.retained]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    movies, _ = PATHS[name](retained_ids)
+    retained = (tracemalloc.get_traced_memory()[0] - before) / len(movies)
+    tracemalloc.stop()
+    del movies
+    db.session.remove()
+
+    report(f"{name} ({args.batch} movies)", durations,
+           f" | {cpu_per_movie:6.1f}µs CPU/movie | peak {peak / 1024:7.1f}KB/batch | {retained:6.0f}B/movie kept")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movies', type=int, default=5000, help='Movies stored in the SQLite database')
+    parser.add_argument('--seeded', action='store_true', help='Use the movies already stored in DATABASE_URI')
+    parser.add_argument('--batch', type=int, default=20, help='Movies loaded per batch')
+    parser.add_argument('--runs', type=int, default=500)
+    parser.add_argument('--retained', type=int, default=1000, help='Movies held to measure the size kept per movie')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if not args.seeded:
+        os.environ['DATABASE_URI'] = 'sqlite://'
+    from src.app import create_app
+
+    app = create_app()
+    with app.app_context():
+        if not args.seeded:
+            fill_sqlite(args.movies)
+        movie_ids = stored_movie_ids(max(args.movies, args.retained))
+        for path in PATHS:
+            benchmark_path(path, movie_ids, args)
@@ -0,0 +1,92 @@
+"""Compare the latency of content-based recommendations with the TMDB /recommendations path.
+
+Usage (from blip-api/):
+    python -m benchmarks.recommender_benchmark --movies 100000 --liked 50
+    python -m benchmarks.recommender_benchmark --tmdb-movie-ids 550,680,13,155  # also measures TMDB, needs TMDB_URL
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.utils import GENRES, LANGUAGES, report
+from src.database.types import Opinion
+from src.services.recommender import ContentRecommender
+
+
+def generate_movies(count, keywords_count, seed, first_id=1):
+    rng = random.Random(seed)
+    return [(movie_id,
+             ','.join(rng.sample(GENRES, rng.randint(1, 3))),
+             [{'id': rng.randint(1, keywords_count)} for _ in range(rng.randint(0, 12))],
+             rng.choice(LANGUAGES),
+             round(rng.uniform(2, 9), 1),
+             rng.paretovariate(1.2) * 5)
+            for movie_id in range(first_id, first_id + count)]
+
+
+def benchmark_content(args):
+    recommender = ContentRecommender()
+    movies = generate_movies(args.movies, args.keywords, args.seed)
+
+    start = time.perf_counter()
+    recommender.add_rows(movies)
+    recommender.ensure_matrix()
+    print(f"Index built: {args.movies} movies, {len(recommender.features)} features "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    new_movies = generate_movies(1000, args.keywords, args.seed + 1, first_id=args.movies + 1)
+    start = time.perf_counter()
+    recommender.add_rows(new_movies)
+    recommender.ensure_matrix()
+    print(f"Incremental add of 1000 movies: {(time.perf_counter() - start) * 1000:.2f}ms")
+
+    rng = random.Random(args.seed)
+    durations = []
+    for user_id in range(args.runs):
+        liked = [(movie_id, rng.choice([Opinion.LOVED_IT, Opinion.WANT_TO_WATCH]))
+                 for movie_id in rng.sample(range(1, args.movies + 1), args.liked)]
+        excluded_ids = {movie_id for movie_id, _ in liked}
+        start = time.perf_counter()
+        recommender.recommend(user_id, liked, args.k, excluded_ids)
+        durations.append(time.perf_counter() - start)
+    report("content (cold profile)", durations)
+
+    durations = []
+    for user_id in range(args.runs):
+        start = time.perf_counter()
+        recommender.recommend(user_id, [], args.k)
+        durations.append(time.perf_counter() - start)
+    report("content (cached profile)", durations)
+
+
+def benchmark_tmdb(args):
+    from src.services.tmdb_client import tmdb_client
+
+    movie_ids = [int(movie_id) for movie_id in args.tmdb_movie_ids.split(',')]
+    durations = []
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for _ in range(args.tmdb_runs):
+            start = time.perf_counter()
+            list(executor.map(lambda movie_id: tmdb_client.get_json(f"/3/movie/{movie_id}/recommendations"),
+                              movie_ids))
+            durations.append(time.perf_counter() - start)
+    report(f"tmdb ({len(movie_ids)} liked movies)", durations)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movies', type=int, default=50000)
+    parser.add_argument('--keywords', type=int, default=20000)
+    parser.add_argument('--liked', type=int, default=30)
+    parser.add_argument('--k', type=int, default=32)
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--tmdb-movie-ids', help='Comma separated TMDB ids used as liked movies for the TMDB path')
+    parser.add_argument('--tmdb-runs', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    benchmark_content(args)
+    if args.tmdb_movie_ids:
+        benchmark_tmdb(args)
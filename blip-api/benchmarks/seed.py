@@ -0,0 +1,108 @@
+"""Seed the database with benchmark users, opinions and a part of the fixtures catalog.
+
+Usage (from blip-api/, on an empty database migrated with `flask --app src.app db upgrade`):
+    DATABASE_URI=postgresql://localhost/blip_bench python -m benchmarks.seed --movies 100000 --stored 0.3 \
+        --users 1000 --opinions 300
+
+Movies that are not stored are fetched from the fake TMDB server by the API, like new movies in production.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from benchmarks import fixtures
+from src.app import create_app
+from src.database import db
+from src.database.models import User, UserMovie, TmdbMovie, MovieWatchProvider, WatchProvider
+from src.database.types import Opinion
+from src.services.availability import availability_rows, regions_to_store
+from src.services.tmdb import movie_fields
+from src.utils import extract_regions_providers_ids
+
+BATCH_SIZE = 1000
+OPINION_WEIGHTS = {Opinion.LOVED_IT: 2, Opinion.DIDNT_LIKE_IT: 2, Opinion.WANT_TO_WATCH: 1, Opinion.PASS: 5}
+
+
+def insert_in_batches(model, rows, on_conflict_do_nothing=False):
+    for i in range(0, len(rows), BATCH_SIZE):
+        statement = pg_insert(model).on_conflict_do_nothing() if on_conflict_do_nothing else insert(model)
+        db.session.execute(statement, rows[i:i + BATCH_SIZE])
+        db.session.commit()
+
+
+def seed_movies(args, rng):
+    today = datetime.now().date()
+    stale_date = today - timedelta(days=2)
+    movies, availabilities = [], []
+    for movie_id in range(1, args.movies + 1):
+        if rng.random() >= args.stored:
+            continue
+        details = fixtures.movie_details_json(movie_id)
+        details['videos'] = fixtures.videos_json(movie_id)
+        details['keywords'] = fixtures.keywords_json(movie_id)
+        # Stale movies are served and refreshed in background
+        last_updated = stale_date if rng.random() < args.stale else today
+        movies.append(movie_fields(details, last_updated))
+        regions = extract_regions_providers_ids(fixtures.watch_providers_json(movie_id))
+        availabilities += availability_rows(movie_id, regions, regions_to_store('FR'), last_updated)
+
+        if len(movies) >= BATCH_SIZE:
+            insert_in_batches(TmdbMovie, movies, on_conflict_do_nothing=True)
+            insert_in_batches(MovieWatchProvider, availabilities)
+            movies, availabilities = [], []
+    insert_in_batches(TmdbMovie, movies, on_conflict_do_nothing=True)
+    insert_in_batches(MovieWatchProvider, availabilities)
+
+
+def seed_users(args, rng):
+    insert_in_batches(WatchProvider, [{'provider_id': provider_id, 'provider_name': provider_name}
+                                      for provider_id, provider_name in fixtures.PROVIDERS],
+                      on_conflict_do_nothing=True)
+    insert_in_batches(User, [{'id': user_id, 'name': f"Bench {user_id}", 'email': f"bench{user_id}@example.com"}
+                             for user_id in range(1, args.users + 1)], on_conflict_do_nothing=True)
+    # Users created by the API afterwards must not collide with the seeded ids
+    db.session.execute(text("SELECT setval(pg_get_serial_sequence('users', 'id'), (SELECT MAX(id) FROM users))"))
+    db.session.commit()
+
+    now = datetime.now()
+    opinions = list(OPINION_WEIGHTS)
+    weights = list(OPINION_WEIGHTS.values())
+    user_movies = []
+    for user_id in range(1, args.users + 1):
+        # Heavy swipers and popular movies are over-represented, like in production
+        count = min(int(rng.paretovariate(1.5) * args.opinions / 3), args.movies)
+        movie_ids = set()
+        while len(movie_ids) < count:
+            movie_ids.add(min(int(rng.paretovariate(0.8)), args.movies))
+        user_movies += [{'user_id': user_id, 'movie_id': movie_id, 'opinion': rng.choices(opinions, weights)[0],
+                         'created_at': now - timedelta(minutes=rng.randint(0, 180 * 24 * 60))}
+                        for movie_id in movie_ids]
+        if len(user_movies) >= BATCH_SIZE:
+            insert_in_batches(UserMovie, user_movies, on_conflict_do_nothing=True)
+            user_movies = []
+    insert_in_batches(UserMovie, user_movies, on_conflict_do_nothing=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movies', type=int, default=100000, help='Catalog size of the fake TMDB server')
+    parser.add_argument('--stored', type=float, default=0.3, help='Share of the catalog already in tmdb_movies')
+    parser.add_argument('--stale', type=float, default=0.1, help='Share of the stored movies to refresh')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--opinions', type=int, default=300, help='Average opinions per user')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    app = create_app()
+    rng = random.Random(args.seed)
+    with app.app_context():
+        start = time.perf_counter()
+        seed_movies(args, rng)
+        print(f"Movies seeded in {time.perf_counter() - start:.1f}s")
+        start = time.perf_counter()
+        seed_users(args, rng)
+        print(f"Users and opinions seeded in {time.perf_counter() - start:.1f}s")
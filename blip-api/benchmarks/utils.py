@@ -0,0 +1,16 @@
+import statistics
+
+GENRES = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 'Drama', 'Family', 'Fantasy',
+          'History', 'Horror', 'Music', 'Mystery', 'Romance', 'Science Fiction', 'Thriller', 'War', 'Western']
+LANGUAGES = ['en', 'fr', 'es', 'ja', 'ko', 'de', 'it', 'hi']
+
+
+def percentiles(durations):
+    durations = sorted(durations)
+    return {f"p{p}": durations[min(len(durations) - 1, int(len(durations) * p / 100))] * 1000 for p in (50, 95, 99)}
+
+
+def report(name, durations, extra=''):
+    stats = percentiles(durations)
+    print(f"{name:<28} mean {statistics.mean(durations) * 1000:8.2f}ms | "
+          + ' | '.join(f"{key} {value:8.2f}ms" for key, value in stats.items()) + extra)
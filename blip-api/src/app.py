@@ -2,12 +2,13 @@ import redis
 from flask import Flask
 from flask_migrate import Migrate
 from src.database import db
+from src.services.metrics import InstrumentedRedis
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-redis_client = redis.Redis(
+redis_client = InstrumentedRedis(
     host=os.getenv("REDIS_HOST", "localhost"),
     port=int(os.getenv("REDIS_PORT", 6379)),
     decode_responses=True
@@ -15,10 +16,18 @@ redis_client = redis.Redis(
 
 def create_app():
     app = Flask(__name__)
+    from src.services.serialization import OrjsonProvider
+    app.json = OrjsonProvider(app)
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI')
     db.init_app(app)
     Migrate(app, db)
 
+    from src.services import metrics
+    metrics.init_app(app)
+
+    from src.services.write_buffer import write_buffer
+    write_buffer.init_app(app)
+
     from src.routes.main import main_bp
     from src.routes.movies import movies_bp
     from src.routes.users import users_bp
@@ -26,6 +35,13 @@ def create_app():
     app.register_blueprint(movies_bp)
     app.register_blueprint(users_bp)
 
+    from src.services.refresh import refresh_worker_command
+    app.cli.add_command(refresh_worker_command)
+    from src.services.collaborative import build_item_neighbours_command
+    app.cli.add_command(build_item_neighbours_command)
+    from src.services.ingest import ingest_catalog_command
+    app.cli.add_command(ingest_catalog_command)
+
     try:
         redis_client.ping()
         print("✅ Redis connected")
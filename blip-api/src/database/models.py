@@ -1,6 +1,6 @@
 
 from src.database import db
-from sqlalchemy import Column, Integer, ForeignKey, Enum, BigInteger, Text, Float, Boolean, VARCHAR, ARRAY, Date
+from sqlalchemy import Column, Integer, ForeignKey, Enum, BigInteger, Text, Float, Boolean, VARCHAR, Date, Index
 from sqlalchemy.dialects.postgresql import JSONB
 
 from src.database.types import Opinion
@@ -29,6 +29,10 @@ class UserMovie(db.Model):
 
     user = db.relationship('User', back_populates='movies')
 
+    __table_args__ = (
+        Index('ix_user_movie_user_id_opinion_created_at', 'user_id', 'opinion', 'created_at', 'movie_id'),
+    )
+
     def __repr__(self):
         return f'<UserMovie movie_id={self.movie_id}, user_id={self.user_id}, opinion={self.opinion.name}>'
 
@@ -62,9 +66,10 @@ class TmdbMovie(db.Model):
     keywords = Column(JSONB)
     trailer_key = Column(Text)
     trailer_key_last_updated = Column(Date)
-    watch_providers_ids = Column(ARRAY(Integer), nullable=True)
-    watch_providers_last_updated = Column(Date)
 
+    __table_args__ = (
+        Index('ix_tmdb_movies_popularity_id', popularity.desc(), id.desc()),
+    )
 
     def __repr__(self):
         return f"<TmdbMovie id={self.id}, title={self.title}, vote_average={self.vote_average}>"
@@ -77,4 +82,23 @@ class WatchProvider(db.Model):
     provider_name = Column(Text, nullable=False)
 
     def __repr__(self):
-        return f"<WatchProvider id={self.id}, provider_name={self.provider_name}>"
\ No newline at end of file
+        return f"<WatchProvider id={self.id}, provider_name={self.provider_name}>"
+
+
+class MovieWatchProvider(db.Model):
+    __tablename__ = "movie_watch_provider"
+
+    id = Column(BigInteger, primary_key=True)
+    movie_id = Column(BigInteger, nullable=False)
+    region = Column(VARCHAR(2), nullable=False)
+    # NULL when the movie is on no flatrate provider in this region
+    provider_id = Column(Integer)
+    last_updated = Column(Date, nullable=False)
+
+    __table_args__ = (
+        Index('ix_movie_watch_provider_movie_id_region', 'movie_id', 'region'),
+        Index('ix_movie_watch_provider_region_provider_id_movie_id', 'region', 'provider_id', 'movie_id'),
+    )
+
+    def __repr__(self):
+        return f"<MovieWatchProvider movie_id={self.movie_id}, region={self.region}, provider_id={self.provider_id}>"
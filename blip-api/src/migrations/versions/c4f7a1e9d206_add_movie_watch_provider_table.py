@@ -0,0 +1,61 @@
+"""Add movie_watch_provider table with watch providers per region
+
+Revision ID: c4f7a1e9d206
+Revises: 9b1e4d2c7a53
+Create Date: 2026-10-18 11:03:27.904615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f7a1e9d206'
+down_revision = '9b1e4d2c7a53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('movie_watch_provider',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('movie_id', sa.BigInteger(), nullable=False),
+        sa.Column('region', sa.VARCHAR(length=2), nullable=False),
+        sa.Column('provider_id', sa.Integer(), nullable=True),
+        sa.Column('last_updated', sa.Date(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('movie_watch_provider', schema=None) as batch_op:
+        batch_op.create_index('ix_movie_watch_provider_movie_id_region', ['movie_id', 'region'], unique=False)
+        batch_op.create_index('ix_movie_watch_provider_region_provider_id_movie_id', ['region', 'provider_id', 'movie_id'], unique=False)
+
+    # Providers had no region until now, they were mostly fetched for the default FR locale
+    op.execute("""
+        INSERT INTO movie_watch_provider (movie_id, region, provider_id, last_updated)
+        SELECT id, 'FR', unnest(watch_providers_ids), watch_providers_last_updated
+        FROM tmdb_movies
+        WHERE watch_providers_last_updated IS NOT NULL AND cardinality(watch_providers_ids) > 0
+        UNION ALL
+        SELECT id, 'FR', NULL, watch_providers_last_updated
+        FROM tmdb_movies
+        WHERE watch_providers_last_updated IS NOT NULL AND coalesce(cardinality(watch_providers_ids), 0) = 0
+    """)
+
+    with op.batch_alter_table('tmdb_movies', schema=None) as batch_op:
+        batch_op.drop_index('ix_tmdb_movies_watch_providers_ids')
+        batch_op.drop_column('watch_providers_last_updated')
+        batch_op.drop_column('watch_providers_ids')
+
+
+def downgrade():
+    with op.batch_alter_table('tmdb_movies', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('watch_providers_ids', postgresql.ARRAY(sa.Integer()), nullable=True))
+        batch_op.add_column(sa.Column('watch_providers_last_updated', sa.Date(), nullable=True))
+        batch_op.create_index('ix_tmdb_movies_watch_providers_ids', ['watch_providers_ids'], unique=False, postgresql_using='gin')
+
+    with op.batch_alter_table('movie_watch_provider', schema=None) as batch_op:
+        batch_op.drop_index('ix_movie_watch_provider_region_provider_id_movie_id')
+        batch_op.drop_index('ix_movie_watch_provider_movie_id_region')
+
+    op.drop_table('movie_watch_provider')
@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, current_app
 from src.database.utils import create_tables
+from src.services.metrics import metrics_response
 from src.services.tmdb import store_watch_providers
 
 main_bp = Blueprint('main', __name__)
@@ -8,4 +9,9 @@ main_bp = Blueprint('main', __name__)
 def home():
     create_tables(current_app)
     store_watch_providers()
-    return jsonify({'message': 'ok'}), 200
\ No newline at end of file
+    return jsonify({'message': 'ok'}), 200
+
+
+@main_bp.route('/metrics', methods=['GET'])
+def metrics():
+    return metrics_response()
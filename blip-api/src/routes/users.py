@@ -2,57 +2,142 @@ from flask import Blueprint, request, jsonify
 from src.database.models import User, UserMovie
 from src.database import db
 from src.database.types import Opinion
+from datetime import datetime
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
 users_bp = Blueprint('users', __name__, url_prefix='/user')
 
+WATCHLIST_PAGE_SIZE = 20
+OPINIONS_BATCH_LIMIT = 100
+
+
+def encode_watchlist_cursor(user_movie):
+    return f"{user_movie.created_at.isoformat()}_{user_movie.movie_id}"
+
+
+def decode_watchlist_cursor(cursor):
+    created_at, movie_id = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(created_at), int(movie_id)
+
+
 @users_bp.route('/<int:user_id>/movies', methods=['GET'])
 def get_user_movies(user_id):
     opinion_filter = request.args.get('opinion')
+    cursor = request.args.get('cursor')
     page = int(request.args.get('page', 1))
-    page_size = 20
+    page_size = WATCHLIST_PAGE_SIZE
 
-    query = UserMovie.query.filter_by(user_id=user_id)
+    query = db.session.query(UserMovie.movie_id, UserMovie.created_at).filter(UserMovie.user_id == user_id)
     if opinion_filter:
         query = query.filter(UserMovie.opinion == Opinion(int(opinion_filter)))
+    query = query.order_by(UserMovie.created_at.desc(), UserMovie.movie_id.desc())
 
-    total_movies = query.count()
-    user_movies = query.order_by(UserMovie.created_at.desc()).limit(page_size).offset(page_size * (page - 1)).all()
-    has_more = (page * page_size) < total_movies
+    if cursor:
+        try:
+            created_at, movie_id = decode_watchlist_cursor(cursor)
+        except ValueError:
+            return jsonify({'message': 'Invalid cursor'}), 400
+        query = query.filter(tuple_(UserMovie.created_at, UserMovie.movie_id) < tuple_(created_at, movie_id))
+    else:
+        # Clients without cursor still page with offsets
+        query = query.offset(page_size * (page - 1))
 
-    detailed_movies = []
-    from src.services.tmdb import get_movie
-    for user_movie in user_movies:
-        enriched = get_movie(user_movie.movie_id, [])
-        if enriched:
-            detailed_movies.append(enriched)
+    # One extra row tells if there is a next page, no need to count the whole list
+    user_movies = query.limit(page_size + 1).all()
+    has_more = len(user_movies) > page_size
+    user_movies = user_movies[:page_size]
+    next_cursor = encode_watchlist_cursor(user_movies[-1]) if has_more else None
 
-    print(f"✅ WatchList retrieved, total: {total_movies}, {[d["id"] for d in detailed_movies]}, {has_more}")
-    return jsonify({"movies": detailed_movies, "has_more": has_more}), 200
+    from src.services.tmdb import get_movies
+    detailed_movies = get_movies([user_movie.movie_id for user_movie in user_movies], [])
 
+    print(f"✅ WatchList retrieved, {[d['id'] for d in detailed_movies]}, {has_more}")
+    return jsonify({"movies": detailed_movies, "has_more": has_more, "next_cursor": next_cursor}), 200
+
+
+def parse_opinion_item(item):
+    # (movie_id, Opinion) or None when the item is invalid
+    try:
+        return int(item['movie_id']), Opinion(int(item['opinion']))
+    except (KeyError, TypeError, ValueError):
+        return None
 
-@users_bp.route('/<int:user_id>/movie', methods=['POST'])
-def add_user_movie(user_id):
-    data = request.json
-    movie_id = data['movie_id']
-    opinion = data['opinion']
 
+def add_movies_to_user(user_id, items):
+    # Stores the opinions in one INSERT, returns a status per item or None when the user does not exist.
+    # A movie already rated by the user keeps its first opinion.
+    parsed_items = [parse_opinion_item(item) for item in items]
+    new_movies = {}
+    for parsed_item in parsed_items:
+        if parsed_item and parsed_item[0] not in new_movies:
+            new_movies[parsed_item[0]] = parsed_item[1]
+
+    added_ids = set()
     with db.engine.begin() as connection:
         session = Session(connection)
-        user = session.get(User, user_id)
-        if user is None:
-            return jsonify({'message': 'User not found'}), 404
-
-        if session.query(UserMovie).filter_by(user_id=user_id, movie_id=movie_id).first():
-            return jsonify({'message': 'Movie already added to user'}), 200
+        if session.get(User, user_id) is None:
+            return None
 
-        print(f"✅ Adding movie {movie_id} to user {user_id}")
-        new_user_movie = UserMovie(user_id=user_id, movie_id=movie_id, opinion=Opinion(opinion))
-        session.add(new_user_movie)
-        session.flush()
+        existing_ids = set(session.scalars(select(UserMovie.movie_id).where(
+            UserMovie.user_id == user_id, UserMovie.movie_id.in_(list(new_movies)))))
+        rows = [{'user_id': user_id, 'movie_id': movie_id, 'opinion': opinion}
+                for movie_id, opinion in new_movies.items() if movie_id not in existing_ids]
+        if rows:
+            # A concurrent request may have stored the same opinions meanwhile
+            added_ids = set(session.scalars(
+                insert(UserMovie).values(rows).on_conflict_do_nothing().returning(UserMovie.movie_id)))
         session.commit()
-        session.expire_all()
 
+    if added_ids:
+        print(f"✅ Added movies {sorted(added_ids)} to user {user_id}")
+        from src.services.feed import remove_from_feed
+        from src.services.interactions import record_user_interactions
+        from src.services.recommender import content_recommender
+        record_user_interactions(user_id, [(movie_id, new_movies[movie_id]) for movie_id in added_ids])
+        remove_from_feed(user_id, added_ids)
+        content_recommender.forget_user(user_id)
+
+    results = []
+    for item, parsed_item in zip(items, parsed_items):
+        if parsed_item is None:
+            results.append({'movie_id': item.get('movie_id') if isinstance(item, dict) else None,
+                            'status': 'invalid'})
+        else:
+            results.append({'movie_id': parsed_item[0],
+                            'status': 'added' if parsed_item[0] in added_ids else 'already_added'})
+            # Duplicates in the same batch are reported once as added
+            added_ids.discard(parsed_item[0])
+    return results
+
+
+@users_bp.route('/<int:user_id>/movies', methods=['POST'])
+def add_user_movies(user_id):
+    data = request.json or {}
+    items = data.get('movies')
+    if not isinstance(items, list):
+        return jsonify({'message': 'Missing movies list'}), 400
+    if len(items) > OPINIONS_BATCH_LIMIT:
+        return jsonify({'message': f"At most {OPINIONS_BATCH_LIMIT} movies per batch"}), 400
+
+    results = add_movies_to_user(user_id, items)
+    if results is None:
+        return jsonify({'message': 'User not found'}), 404
+    return jsonify({'results': results}), 200
+
+
+@users_bp.route('/<int:user_id>/movie', methods=['POST'])
+def add_user_movie(user_id):
+    results = add_movies_to_user(user_id, [request.json])
+    if results is None:
+        return jsonify({'message': 'User not found'}), 404
+
+    status = results[0]['status']
+    if status == 'invalid':
+        return jsonify({'message': 'Invalid movie_id or opinion'}), 400
+    if status == 'already_added':
+        return jsonify({'message': 'Movie already added to user'}), 200
     return jsonify({'message': 'Movie added to user'}), 200
 
 @users_bp.route('', methods=['POST'])
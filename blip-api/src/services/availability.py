@@ -0,0 +1,48 @@
+import os
+
+from sqlalchemy import select
+
+from src.database import db
+from src.database.models import MovieWatchProvider
+from src.services.write_buffer import write_buffer
+
+# Regions stored whatever region a movie is fetched for, other regions are stored once someone asks for them
+STORED_REGIONS = {region.strip().upper() for region in os.getenv('STORED_REGIONS', 'FR').split(',') if region.strip()}
+
+
+def get_movies_availability(movie_ids, region):
+    # {movie_id: {'provider_ids': set, 'last_updated': date}}, movies never fetched for this region are missing
+    if not movie_ids:
+        return {}
+    rows = db.session.execute(
+        select(MovieWatchProvider.movie_id, MovieWatchProvider.provider_id, MovieWatchProvider.last_updated)
+        .where(MovieWatchProvider.movie_id.in_(movie_ids), MovieWatchProvider.region == region.upper())
+    ).all()
+    availability = {}
+    for movie_id, provider_id, last_updated in rows:
+        movie_availability = availability.setdefault(movie_id, {'provider_ids': set(), 'last_updated': last_updated})
+        if provider_id is not None:
+            movie_availability['provider_ids'].add(provider_id)
+    availability.update(write_buffer.get_availability(movie_ids, region))
+    return availability
+
+
+def regions_to_store(*regions):
+    return STORED_REGIONS | {region.upper() for region in regions}
+
+
+def store_movies_availability(regions_providers_ids, region, today):
+    # regions_providers_ids: {movie_id: {region: [provider_id, ...]}}, replaces the requested region and
+    # STORED_REGIONS of these movies. Rows are written by the write buffer.
+    if not regions_providers_ids:
+        return
+    stored_regions = regions_to_store(region)
+    write_buffer.add_availability({movie_id: availability_rows(movie_id, regions, stored_regions, today)
+                                   for movie_id, regions in regions_providers_ids.items()})
+
+
+def availability_rows(movie_id, regions, stored_regions, today):
+    # movie_watch_provider rows of a movie in stored_regions, regions: {region: [provider_id, ...]}.
+    # A stored region gets a NULL provider row when the movie is on no flatrate provider there.
+    return [{'movie_id': movie_id, 'region': region, 'provider_id': provider_id, 'last_updated': today}
+            for region in sorted(stored_regions) for provider_id in regions.get(region) or [None]]
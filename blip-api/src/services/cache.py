@@ -0,0 +1,149 @@
+import json
+import os
+from datetime import datetime
+from urllib.parse import urlencode
+
+import redis
+
+from src.app import redis_client
+from src.services.metrics import count
+from src.services.serialization import dumps, loads
+from src.services.tmdb_client import tmdb_client, tmdb_endpoint
+
+MOVIE_CACHE_MAX_TTL = int(os.getenv('MOVIE_CACHE_MAX_TTL', 86400))
+MOVIE_CACHE_LOCALES_KEY = 'movie_cache_locales'
+
+# Movies we can't show, not retried before their mark expires
+NOT_FOUND = 'not_found'
+NO_POSTER = 'no_poster'
+NEGATIVE_CACHE_TTLS = {
+    NOT_FOUND: int(os.getenv('NOT_FOUND_RETRY_DAYS', 30)) * 86400,
+    NO_POSTER: int(os.getenv('NO_POSTER_RETRY_DAYS', 7)) * 86400,
+}
+
+# Non user-specific TMDB responses, shared by every user for a day
+TMDB_RESPONSE_TTLS = {
+    '/3/movie/{id}/recommendations': int(os.getenv('TMDB_RECOMMENDATIONS_CACHE_TTL', 86400)),
+    '/3/discover/movie': int(os.getenv('TMDB_DISCOVER_CACHE_TTL', 86400)),
+}
+
+
+def movie_cache_key(movie_id, locale):
+    return f"movie:{locale.upper()}:{movie_id}"
+
+
+def seconds_until_stale(*stale_dates):
+    if any(date is None for date in stale_dates):
+        return 0
+    stale_at = datetime.combine(min(stale_dates), datetime.min.time())
+    return min(int((stale_at - datetime.now()).total_seconds()), MOVIE_CACHE_MAX_TTL)
+
+
+def get_cached_movies(movie_ids, locale):
+    if not movie_ids:
+        return {}
+    try:
+        values = redis_client.mget([movie_cache_key(movie_id, locale) for movie_id in movie_ids])
+    except redis.RedisError as e:
+        print(f"⚠️ Redis error while reading movie cache: {e}")
+        return {}
+    movies = {movie_id: loads(value) for movie_id, value in zip(movie_ids, values) if value}
+    count('movie_cache_hits', len(movies))
+    count('movie_cache_misses', len(movie_ids) - len(movies))
+    return movies
+
+
+def cache_movies(entries, locale):
+    # entries: list of (movie_id, payload, ttl)
+    entries = [(movie_id, payload, ttl) for movie_id, payload, ttl in entries if ttl > 0]
+    if not entries:
+        return
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.sadd(MOVIE_CACHE_LOCALES_KEY, locale.upper())
+        for movie_id, payload, ttl in entries:
+            pipeline.set(movie_cache_key(movie_id, locale), dumps(payload), ex=ttl)
+        pipeline.execute()
+    except redis.RedisError as e:
+        print(f"⚠️ Redis error while writing movie cache: {e}")
+
+
+def invalidate_movies(movie_ids):
+    if not movie_ids:
+        return
+    try:
+        locales = redis_client.smembers(MOVIE_CACHE_LOCALES_KEY)
+        keys = [movie_cache_key(movie_id, locale) for movie_id in movie_ids for locale in locales]
+        if keys:
+            redis_client.delete(*keys)
+    except redis.RedisError as e:
+        print(f"⚠️ Redis error while invalidating movie cache: {e}")
+
+
+def negative_cache_key(reason, movie_id):
+    return f"negative:{reason}:{movie_id}"
+
+
+def mark_negative(reason, movie_ids):
+    if not movie_ids:
+        return
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        for movie_id in movie_ids:
+            pipeline.set(negative_cache_key(reason, movie_id), 1, ex=NEGATIVE_CACHE_TTLS[reason])
+        pipeline.execute()
+    except redis.RedisError as e:
+        print(f"⚠️ Redis error while writing negative cache: {e}")
+
+
+def get_marked_movie_ids(reason, movie_ids):
+    if not movie_ids:
+        return set()
+    try:
+        values = redis_client.mget([negative_cache_key(reason, movie_id) for movie_id in movie_ids])
+    except redis.RedisError as e:
+        print(f"⚠️ Redis error while reading negative cache: {e}")
+        return set()
+    return {movie_id for movie_id, value in zip(movie_ids, values) if value}
+
+
+def get_unusable_movie_ids(movie_ids):
+    if not movie_ids:
+        return set()
+    reasons = list(NEGATIVE_CACHE_TTLS)
+    try:
+        values = redis_client.mget([negative_cache_key(reason, movie_id) for movie_id in movie_ids for reason in reasons])
+    except redis.RedisError as e:
+        print(f"⚠️ Redis error while reading negative cache: {e}")
+        return set()
+    return {movie_id for i, movie_id in enumerate(movie_ids) if any(values[i * len(reasons):(i + 1) * len(reasons)])}
+
+
+def tmdb_response_key(path, params):
+    normalized_params = urlencode(sorted((key, str(value)) for key, value in (params or {}).items()))
+    return f"tmdb:{path}?{normalized_params}"
+
+
+def get_tmdb_json_cached(path, params=None):
+    # Read-through cache in front of tmdb_client.get_json, errors are never cached
+    endpoint = tmdb_endpoint(path)
+    ttl = TMDB_RESPONSE_TTLS.get(endpoint)
+    key = tmdb_response_key(path, params)
+    try:
+        cached = redis_client.get(key) if ttl else None
+    except redis.RedisError as e:
+        print(f"⚠️ Redis error while reading TMDB cache: {e}")
+        cached = None
+    if cached:
+        count('tmdb_cache_hits', endpoint=endpoint)
+        return json.loads(cached)
+    if ttl:
+        count('tmdb_cache_misses', endpoint=endpoint)
+
+    response_json = tmdb_client.get_json(path, params=params)
+    if response_json is not None and ttl:
+        try:
+            redis_client.set(key, json.dumps(response_json), ex=ttl)
+        except redis.RedisError as e:
+            print(f"⚠️ Redis error while writing TMDB cache: {e}")
+    return response_json
@@ -0,0 +1,134 @@
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import click
+import numpy as np
+import redis
+from flask.cli import with_appcontext
+from scipy import sparse
+from sqlalchemy import func, select
+
+from src.app import redis_client
+from src.database import db
+from src.database.models import UserMovie
+from src.services.interactions import OPINION_WEIGHTS
+
+ITEM_NEIGHBOURS_LIMIT = int(os.getenv('ITEM_NEIGHBOURS_LIMIT', 50))
+ITEM_NEIGHBOURS_CHUNK_SIZE = int(os.getenv('ITEM_NEIGHBOURS_CHUNK_SIZE', 1000))
+ITEM_NEIGHBOURS_LAST_RUN_KEY = 'item_neighbours_last_run'
+
+
+def item_neighbours_key(movie_id):
+    return f"item_neighbours:{movie_id}"
+
+
+def get_collaborative_recommendations(liked_movie_ids, k, excluded_ids=()):
+    # Sum of the neighbour similarities of the liked movies, one Redis round trip
+    if not liked_movie_ids:
+        return []
+    pipeline = redis_client.pipeline(transaction=False)
+    for movie_id in liked_movie_ids:
+        pipeline.zrevrange(item_neighbours_key(movie_id), 0, ITEM_NEIGHBOURS_LIMIT - 1, withscores=True)
+    try:
+        neighbours_lists = pipeline.execute()
+    except redis.RedisError as e:
+        print(f"⚠️ Redis error while reading item neighbours: {e}")
+        return []
+
+    scores = defaultdict(float)
+    for neighbours in neighbours_lists:
+        for movie_id, similarity in neighbours:
+            scores[int(movie_id)] += similarity
+    ranked_ids = sorted((movie_id for movie_id in scores if movie_id not in excluded_ids), key=scores.get,
+                        reverse=True)
+    return ranked_ids[:k]
+
+
+def item_norms(movie_ids=None):
+    # Squared norms of the movie columns over every user, movie_ids=None for all movies
+    query = (db.session.query(UserMovie.movie_id, UserMovie.opinion, func.count())
+             .filter(UserMovie.opinion.in_(OPINION_WEIGHTS)))
+    if movie_ids is not None:
+        query = query.filter(UserMovie.movie_id.in_(movie_ids))
+    norms = defaultdict(float)
+    for movie_id, opinion, count in query.group_by(UserMovie.movie_id, UserMovie.opinion):
+        norms[movie_id] += count * OPINION_WEIGHTS[opinion] ** 2
+    return norms
+
+
+def store_item_neighbours(movie_id, neighbours):
+    # neighbours: {movie_id: similarity}, also offers movie_id to the neighbour lists of its neighbours
+    pipeline = redis_client.pipeline(transaction=False)
+    pipeline.delete(item_neighbours_key(movie_id))
+    if neighbours:
+        pipeline.zadd(item_neighbours_key(movie_id), neighbours)
+    for neighbour_id, similarity in neighbours.items():
+        pipeline.zadd(item_neighbours_key(neighbour_id), {movie_id: similarity})
+        pipeline.zremrangebyrank(item_neighbours_key(neighbour_id), 0, -(ITEM_NEIGHBOURS_LIMIT + 1))
+    pipeline.execute()
+
+
+def build_item_neighbours(full=False):
+    # Recomputes the neighbours of the movies that got a positive opinion since the last run
+    start = time.time()
+    last_run = None if full else redis_client.get(ITEM_NEIGHBOURS_LAST_RUN_KEY)
+    last_run = datetime.fromisoformat(last_run) if last_run else None
+
+    new_rows = (db.session.query(UserMovie.movie_id, func.max(UserMovie.created_at))
+                .filter(UserMovie.opinion.in_(OPINION_WEIGHTS)))
+    if last_run:
+        new_rows = new_rows.filter(UserMovie.created_at > last_run)
+    new_rows = new_rows.group_by(UserMovie.movie_id).all()
+    if not new_rows:
+        print("✅ Item neighbours already up to date")
+        return 0
+    affected_ids = [movie_id for movie_id, _ in new_rows]
+    run_until = max(created_at for _, created_at in new_rows)
+
+    # Every positive opinion of the users who gave one to an affected movie
+    rows = db.session.query(UserMovie.user_id, UserMovie.movie_id, UserMovie.opinion).filter(
+        UserMovie.opinion.in_(OPINION_WEIGHTS))
+    if last_run:
+        users = select(UserMovie.user_id).where(UserMovie.movie_id.in_(affected_ids),
+                                                UserMovie.opinion.in_(OPINION_WEIGHTS))
+        rows = rows.filter(UserMovie.user_id.in_(users))
+    rows = rows.all()
+
+    user_index, movie_index = {}, {}
+    user_rows = [user_index.setdefault(user_id, len(user_index)) for user_id, _, _ in rows]
+    movie_cols = [movie_index.setdefault(movie_id, len(movie_index)) for _, movie_id, _ in rows]
+    weights = [OPINION_WEIGHTS[opinion] for _, _, opinion in rows]
+    interactions = sparse.csc_matrix((weights, (user_rows, movie_cols)), shape=(len(user_index), len(movie_index)))
+    movie_ids = np.array(list(movie_index))
+
+    norms = item_norms(None if full else list(movie_index))
+    norms = np.sqrt(np.array([norms.get(movie_id, 0) for movie_id in movie_ids]))
+    norms[norms == 0] = 1
+
+    affected_cols = [movie_index[movie_id] for movie_id in affected_ids if movie_id in movie_index]
+    for i in range(0, len(affected_cols), ITEM_NEIGHBOURS_CHUNK_SIZE):
+        chunk = affected_cols[i:i + ITEM_NEIGHBOURS_CHUNK_SIZE]
+        # Co-occurrence of the chunk movies with every movie, then cosine similarity
+        cooccurrence = (interactions[:, chunk].T @ interactions).tocsr()
+        for row, col in enumerate(chunk):
+            start_ptr, end_ptr = cooccurrence.indptr[row], cooccurrence.indptr[row + 1]
+            neighbour_cols = cooccurrence.indices[start_ptr:end_ptr]
+            similarities = cooccurrence.data[start_ptr:end_ptr] / (norms[col] * norms[neighbour_cols])
+            similarities[neighbour_cols == col] = 0
+            top = np.argsort(-similarities)[:ITEM_NEIGHBOURS_LIMIT]
+            store_item_neighbours(int(movie_ids[col]), {int(movie_ids[neighbour_cols[j]]): float(similarities[j])
+                                                        for j in top if similarities[j] > 0})
+
+    redis_client.set(ITEM_NEIGHBOURS_LAST_RUN_KEY, run_until.isoformat())
+    print(f"🤝 Item neighbours updated for {len(affected_cols)} movies from {len(rows)} opinions "
+          f"in {time.time() - start:.2f}s")
+    return len(affected_cols)
+
+
+@click.command('build-item-neighbours')
+@click.option('--full', is_flag=True, help='Rebuild every movie instead of the ones with new opinions.')
+@with_appcontext
+def build_item_neighbours_command(full):
+    build_item_neighbours(full)
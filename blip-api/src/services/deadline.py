@@ -0,0 +1,36 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+# time.monotonic() by which the current request must answer, None when it has no budget (background work)
+current_deadline = contextvars.ContextVar('current_deadline', default=None)
+
+
+def remaining_seconds():
+    deadline = current_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def deadline_exceeded():
+    remaining = remaining_seconds()
+    return remaining is not None and remaining <= 0
+
+
+def can_wait(seconds):
+    remaining = remaining_seconds()
+    return remaining is None or seconds < remaining
+
+
+def bounded_timeout(timeout):
+    # Outbound calls never outlive the budget of the request
+    remaining = remaining_seconds()
+    return timeout if remaining is None else min(timeout, remaining)
+
+
+@contextmanager
+def deadline_at(deadline):
+    token = current_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        current_deadline.reset(token)
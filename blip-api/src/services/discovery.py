@@ -0,0 +1,76 @@
+import os
+
+from sqlalchemy import select, exists, tuple_
+
+from src.app import redis_client
+from src.database import db
+from src.database.models import TmdbMovie, UserMovie, MovieWatchProvider
+from src.services.deadline import deadline_exceeded
+
+LOCAL_DISCOVER_MAX_QUERIES = int(os.getenv('LOCAL_DISCOVER_MAX_QUERIES', 5))
+
+
+def discover_cursor_key(user_id, locale, providers_ids):
+    # A cursor walks the pool of one locale and provider set, switching platforms must not skip the other pool
+    return f"discover_cursor_{user_id}:{locale.upper()}:{','.join(map(str, sorted(providers_ids)))}"
+
+
+def get_discover_cursor(user_id, locale, providers_ids):
+    cursor = redis_client.get(discover_cursor_key(user_id, locale, providers_ids))
+    if not cursor:
+        return None
+    popularity, movie_id = cursor.split(':')
+    return float(popularity), int(movie_id)
+
+
+def set_discover_cursor(user_id, locale, providers_ids, cursor):
+    key = discover_cursor_key(user_id, locale, providers_ids)
+    if cursor is None:
+        redis_client.delete(key)
+    else:
+        redis_client.set(key, f"{cursor[0]}:{cursor[1]}", ex=86400)
+
+
+def find_local_popular_movies(user_id, providers_ids, region, excluded_ids, limit, cursor=None):
+    # Popular movies of our catalog available in region that the user never interacted with,
+    # in (popularity, id) keyset order. excluded_ids: movies of the deck not stored as opinions, NOT EXISTS
+    # covers the opinions.
+    query = (select(TmdbMovie.id, TmdbMovie.popularity)
+             .where(TmdbMovie.poster_path.isnot(None), TmdbMovie.popularity.isnot(None))
+             .where(~exists().where(UserMovie.user_id == user_id, UserMovie.movie_id == TmdbMovie.id)))
+    if providers_ids:
+        query = query.where(exists().where(MovieWatchProvider.movie_id == TmdbMovie.id,
+                                           MovieWatchProvider.region == region.upper(),
+                                           MovieWatchProvider.provider_id.in_(providers_ids)))
+    if excluded_ids:
+        query = query.where(TmdbMovie.id.notin_(excluded_ids))
+    if cursor:
+        query = query.where(tuple_(TmdbMovie.popularity, TmdbMovie.id) < tuple_(*cursor))
+    query = query.order_by(TmdbMovie.popularity.desc(), TmdbMovie.id.desc()).limit(limit)
+    return db.session.execute(query).all()
+
+
+def iter_local_movies(n, user_id, exclusions, providers, providers_ids, locale='FR'):
+    # Yields the enriched movies of each query, n movies at most
+    from src.services.tmdb import get_movies, next_chunk_size
+
+    count = 0
+    cursor = get_discover_cursor(user_id, locale, providers_ids)
+    try:
+        for _ in range(LOCAL_DISCOVER_MAX_QUERIES):
+            if count >= n or deadline_exceeded():
+                break
+            candidates = find_local_popular_movies(user_id, providers_ids, locale, exclusions.movie_ids,
+                                                   next_chunk_size(n - count), cursor)
+            if not candidates:
+                # The local pool is dry, start again from the most popular movies next time
+                cursor = None
+                break
+            movies = get_movies([candidate.id for candidate in candidates], providers, locale)
+            cursor = (candidates[-1].popularity, candidates[-1].id)
+            count += len(movies)
+            yield movies
+    finally:
+        set_discover_cursor(user_id, locale, providers_ids, cursor)
+        print(f"🔍 Found {count} movies in local catalog")
+
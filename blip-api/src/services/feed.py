@@ -0,0 +1,113 @@
+import os
+
+import redis
+
+from src.app import redis_client
+from src.services.serialization import dumps, loads
+
+DISCOVER_FEED_TTL = int(os.getenv('DISCOVER_FEED_TTL', 3600))
+DISCOVER_FEED_PREFETCH_LOCK_TTL = 120
+
+
+# The feed of a user is a list of movie ids in serving order, with their enriched payloads in a hash,
+# computed for one set of discover parameters
+def feed_key(user_id):
+    return f"discover_feed:{user_id}"
+
+
+def feed_movies_key(user_id):
+    return f"discover_feed_movies:{user_id}"
+
+
+def feed_params_key(user_id):
+    return f"discover_feed_params:{user_id}"
+
+
+def prefetch_lock_key(user_id):
+    return f"discover_feed_prefetch:{user_id}"
+
+
+def discover_feed_params(providers, locale):
+    return f"{locale.upper()}:{','.join(map(str, sorted(provider_id for provider_id, _ in providers)))}"
+
+
+def pop_feed(user_id, params, n):
+    # Up to n prefetched movies, the feed is dropped when it was computed for other parameters
+    try:
+        if redis_client.get(feed_params_key(user_id)) != params:
+            pipeline = redis_client.pipeline()
+            pipeline.delete(feed_key(user_id), feed_movies_key(user_id))
+            pipeline.set(feed_params_key(user_id), params, ex=DISCOVER_FEED_TTL)
+            pipeline.execute()
+            return []
+
+        movie_ids = redis_client.lpop(feed_key(user_id), n) or []
+        if not movie_ids:
+            return []
+        pipeline = redis_client.pipeline()
+        pipeline.hmget(feed_movies_key(user_id), movie_ids)
+        pipeline.hdel(feed_movies_key(user_id), *movie_ids)
+        payloads, _ = pipeline.execute()
+    except redis.RedisError as e:
+        print(f"⚠️ Redis error while reading discover feed: {e}")
+        return []
+    return [loads(payload) for payload in payloads if payload]
+
+
+def get_feed_ids(user_id):
+    try:
+        return {int(movie_id) for movie_id in redis_client.lrange(feed_key(user_id), 0, -1)}
+    except redis.RedisError as e:
+        print(f"⚠️ Redis error while reading discover feed: {e}")
+        return set()
+
+
+def push_feed(user_id, params, movies):
+    # Appends the movies unless the user changed parameters since the feed was computed
+    if not movies:
+        return
+    try:
+        with redis_client.pipeline() as pipeline:
+            pipeline.watch(feed_params_key(user_id))
+            if pipeline.get(feed_params_key(user_id)) != params:
+                return
+            pipeline.multi()
+            # Payloads first, a popped id always has its payload
+            pipeline.hset(feed_movies_key(user_id), mapping={movie['id']: dumps(movie) for movie in movies})
+            pipeline.rpush(feed_key(user_id), *[movie['id'] for movie in movies])
+            for key in (feed_key(user_id), feed_movies_key(user_id), feed_params_key(user_id)):
+                pipeline.expire(key, DISCOVER_FEED_TTL)
+            pipeline.execute()
+    except redis.WatchError:
+        print(f"🔀 Discover parameters of user {user_id} changed, prefetched movies dropped")
+    except redis.RedisError as e:
+        print(f"⚠️ Redis error while writing discover feed: {e}")
+
+
+def remove_from_feed(user_id, movie_ids):
+    # Movies the user gave an opinion on must not be served again
+    if not movie_ids:
+        return
+    try:
+        pipeline = redis_client.pipeline()
+        for movie_id in movie_ids:
+            pipeline.lrem(feed_key(user_id), 0, movie_id)
+        pipeline.hdel(feed_movies_key(user_id), *movie_ids)
+        pipeline.execute()
+    except redis.RedisError as e:
+        print(f"⚠️ Redis error while updating discover feed: {e}")
+
+
+def acquire_prefetch_lock(user_id):
+    try:
+        return bool(redis_client.set(prefetch_lock_key(user_id), 1, nx=True, ex=DISCOVER_FEED_PREFETCH_LOCK_TTL))
+    except redis.RedisError as e:
+        print(f"⚠️ Redis error while locking discover feed: {e}")
+        return False
+
+
+def release_prefetch_lock(user_id):
+    try:
+        redis_client.delete(prefetch_lock_key(user_id))
+    except redis.RedisError as e:
+        print(f"⚠️ Redis error while unlocking discover feed: {e}")
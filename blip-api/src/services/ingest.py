@@ -0,0 +1,203 @@
+import gzip
+import io
+import json
+import os
+import time
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import JSONB
+
+from src.app import redis_client
+from src.database import db
+from src.database.models import TmdbMovie, MovieWatchProvider
+from src.services.availability import availability_rows, regions_to_store
+from src.services.cache import get_marked_movie_ids, invalidate_movies, mark_negative, NOT_FOUND, NO_POSTER
+from src.services.metrics import count
+from src.services.refresh import REFRESH_LOCALE
+from src.services.tmdb import fetch_movie_details, movie_fields, run_concurrently
+from src.services.tmdb_client import TmdbClient, TMDB_URL, TMDB_BEARER_TOKEN, TMDB_RATE_LIMIT, RATE_LIMIT_KEY
+from src.utils import extract_regions_providers_ids
+
+# Movies fetched from TMDB then loaded per transaction
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 500))
+INGEST_CHECKPOINT_TTL = 30 * 86400
+# Requests per second of the ingest, also counted in TMDB_RATE_LIMIT so that the API keeps the rest of it
+INGEST_RATE_LIMIT = float(os.getenv('INGEST_RATE_LIMIT', 10))
+INGEST_RATE_LIMIT_KEY = 'tmdb_ingest_rate_limit'
+
+MOVIE_COLUMNS = [column.name for column in TmdbMovie.__table__.columns]
+JSON_COLUMNS = {column.name for column in TmdbMovie.__table__.columns if isinstance(column.type, JSONB)}
+AVAILABILITY_COLUMNS = ['movie_id', 'region', 'provider_id', 'last_updated']
+
+
+def checkpoint_key(path):
+    return f"catalog_ingest_checkpoint:{os.path.basename(path)}"
+
+
+def retry_key(path):
+    # Ids before the checkpoint whose fetch failed on a TMDB error, fetched again at the end of each run
+    return f"catalog_ingest_retry:{os.path.basename(path)}"
+
+
+def iter_export_batches(path, start_line, batch_size, min_popularity, include_adult):
+    # Streams a TMDB daily id export (gzipped JSON lines), yields (last line read, movie ids) batches.
+    # Only one batch of ids is in memory, whatever the size of the export.
+    batch = []
+    line_number = yielded_line = start_line
+    with gzip.open(path, 'rt', encoding='utf-8') as export:
+        for line_number, line in enumerate(export, start=1):
+            if line_number <= start_line or not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry.get('adult') and not include_adult:
+                continue
+            if (entry.get('popularity') or 0) < min_popularity:
+                continue
+            batch.append(entry['id'])
+            if len(batch) >= batch_size:
+                yield line_number, batch
+                batch = []
+                yielded_line = line_number
+    if line_number > yielded_line:
+        yield line_number, batch
+
+
+def fetch_movies(client, movie_ids, regions, today):
+    # tmdb_movies and movie_watch_provider rows of the movies found on TMDB, and the ids that failed on a
+    # TMDB error (timeout, 5xx, rate limit) rather than a 404
+    movies, availability, missing_ids = [], [], []
+    stored_regions = regions_to_store(*regions)
+    for movie_id, response_json in zip(movie_ids, run_concurrently(fetch_movie_details, movie_ids, client)):
+        if not response_json:
+            missing_ids.append(movie_id)
+            continue
+        movie_regions = extract_regions_providers_ids(response_json.get('watch/providers', {}))
+        movies.append(movie_fields(response_json, today))
+        availability += availability_rows(response_json['id'], movie_regions, stored_regions, today)
+    not_found_ids = get_marked_movie_ids(NOT_FOUND, missing_ids)
+    return movies, availability, [movie_id for movie_id in missing_ids if movie_id not in not_found_ids]
+
+
+def copy_value(value):
+    # COPY text format: NULL is \N, backslashes, tabs and newlines are escaped
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_rows(cursor, table, columns, rows):
+    data = io.StringIO(''.join('\t'.join(copy_value(value) for value in row) + '\n' for row in rows))
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", data)
+
+
+def bulk_load(movies, availability):
+    # COPY into temporary tables, then a single upsert per table: one round trip per table whatever the batch size
+    movie_columns = ', '.join(MOVIE_COLUMNS)
+    updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in MOVIE_COLUMNS if column != 'id')
+    availability_columns = ', '.join(AVAILABILITY_COLUMNS)
+    with db.engine.begin() as connection:
+        cursor = connection.connection.cursor()
+        cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS ingest_movies (LIKE {TmdbMovie.__tablename__}) "
+                       "ON COMMIT DELETE ROWS")
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS ingest_availability "
+                       "(movie_id bigint, region varchar(2), provider_id integer, last_updated date) "
+                       "ON COMMIT DELETE ROWS")
+
+        copy_rows(cursor, 'ingest_movies', MOVIE_COLUMNS,
+                  [[json.dumps(movie[column]) if column in JSON_COLUMNS else movie[column] for column in MOVIE_COLUMNS]
+                   for movie in movies])
+        # Ids are written in order so that the API writing the same movies meanwhile locks them in the same order
+        cursor.execute(f"INSERT INTO {TmdbMovie.__tablename__} ({movie_columns}) "
+                       f"SELECT {movie_columns} FROM ingest_movies ORDER BY id "
+                       f"ON CONFLICT (id) DO UPDATE SET {updates}")
+
+        copy_rows(cursor, 'ingest_availability', AVAILABILITY_COLUMNS,
+                  [[row[column] for column in AVAILABILITY_COLUMNS] for row in availability])
+        cursor.execute(f"DELETE FROM {MovieWatchProvider.__tablename__} "
+                       "WHERE (movie_id, region) IN (SELECT movie_id, region FROM ingest_availability)")
+        cursor.execute(f"INSERT INTO {MovieWatchProvider.__tablename__} ({availability_columns}) "
+                       f"SELECT {availability_columns} FROM ingest_availability ORDER BY movie_id")
+
+
+def ingest_batch(client, movie_ids, regions, today, refresh_existing):
+    # Returns (movies loaded, ids that failed on a TMDB error)
+    if movie_ids and not refresh_existing:
+        stored_ids = set(db.session.scalars(select(TmdbMovie.id).where(TmdbMovie.id.in_(movie_ids))))
+        movie_ids = [movie_id for movie_id in movie_ids if movie_id not in stored_ids]
+        db.session.remove()
+
+    movies, availability, failed_ids = fetch_movies(client, movie_ids, regions, today)
+    if movies:
+        bulk_load(movies, availability)
+        mark_negative(NO_POSTER, [movie['id'] for movie in movies if not movie['poster_path']])
+        if refresh_existing:
+            invalidate_movies([movie['id'] for movie in movies])
+    count('ingested_movies', len(movies))
+    return len(movies), failed_ids
+
+
+def retry_failed(client, path, batch_size, regions, today, refresh_existing):
+    # Ids still failing stay in the retry list for the next run
+    key = retry_key(path)
+    movie_ids = sorted(int(movie_id) for movie_id in redis_client.smembers(key))
+    total = 0
+    for i in range(0, len(movie_ids), batch_size):
+        batch = movie_ids[i:i + batch_size]
+        loaded, failed_ids = ingest_batch(client, batch, regions, today, refresh_existing)
+        done_ids = set(batch) - set(failed_ids)
+        if done_ids:
+            redis_client.srem(key, *done_ids)
+        total += loaded
+    if movie_ids:
+        print(f"🔁 Retried {len(movie_ids)} failed ids, {total} movies ingested, "
+              f"{redis_client.scard(key)} still failing")
+    return total
+
+
+def ingest_catalog(path, batch_size=INGEST_BATCH_SIZE, regions=(REFRESH_LOCALE,), min_popularity=0,
+                   include_adult=False, refresh_existing=False, restart=False, rate=INGEST_RATE_LIMIT):
+    key = checkpoint_key(path)
+    if restart:
+        redis_client.delete(retry_key(path))
+    start_line = 0 if restart else int(redis_client.get(key) or 0)
+    if start_line:
+        print(f"⏩ Resuming {path} after line {start_line}")
+
+    # A bucket of its own on top of the shared one, live requests keep TMDB_RATE_LIMIT - rate
+    client = TmdbClient(TMDB_URL, TMDB_BEARER_TOKEN, redis_client,
+                        rate_limits=((INGEST_RATE_LIMIT_KEY, rate), (RATE_LIMIT_KEY, TMDB_RATE_LIMIT)))
+    today = datetime.now().date()
+    regions = [region.upper() for region in regions]
+    start = time.monotonic()
+    total = 0
+    for line_number, movie_ids in iter_export_batches(path, start_line, batch_size, min_popularity, include_adult):
+        loaded, failed_ids = ingest_batch(client, movie_ids, regions, today, refresh_existing)
+        if failed_ids:
+            redis_client.sadd(retry_key(path), *failed_ids)
+            redis_client.expire(retry_key(path), INGEST_CHECKPOINT_TTL)
+        # Everything up to this line is committed or in the retry list, a new run starts after it
+        redis_client.set(key, line_number, ex=INGEST_CHECKPOINT_TTL)
+
+        total += loaded
+        print(f"📦 Line {line_number}: {loaded}/{len(movie_ids)} movies ingested, {len(failed_ids)} to retry, "
+              f"{total} in total ({total / (time.monotonic() - start):.1f} movies/s)")
+    total += retry_failed(client, path, batch_size, regions, today, refresh_existing)
+    print(f"✅ Ingested {total} movies from {path}")
+
+
+@click.command('ingest-catalog')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=INGEST_BATCH_SIZE, help='Movies fetched and loaded per transaction.')
+@click.option('--regions', default=REFRESH_LOCALE, help='Comma separated regions stored besides STORED_REGIONS.')
+@click.option('--min-popularity', default=0.0, help='Skip the movies of the export below this popularity.')
+@click.option('--include-adult', is_flag=True, help='Also ingest adult movies.')
+@click.option('--refresh-existing', is_flag=True, help='Fetch the movies already stored again.')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint of a previous run on this file.')
+@click.option('--rate', default=INGEST_RATE_LIMIT, help='TMDB requests per second, taken from TMDB_RATE_LIMIT.')
+@with_appcontext
+def ingest_catalog_command(path, batch_size, regions, min_popularity, include_adult, refresh_existing, restart, rate):
+    ingest_catalog(path, batch_size, regions.split(','), min_popularity, include_adult, refresh_existing, restart,
+                   rate)
@@ -0,0 +1,144 @@
+import os
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import redis
+from sqlalchemy import select
+
+from src.app import redis_client
+from src.database import db
+from src.database.models import UserMovie
+from src.database.types import Opinion
+
+INTERACTIONS_CACHE_TTL = int(os.getenv('INTERACTIONS_CACHE_TTL', 7 * 86400))
+# Most recent liked movies kept for recommendations, older tastes matter less
+LIKED_MOVIES_LIMIT = int(os.getenv('LIKED_MOVIES_LIMIT', 200))
+# Weight of each liked opinion in the content-based and collaborative recommenders
+OPINION_WEIGHTS = {Opinion.LOVED_IT: 1.0, Opinion.WANT_TO_WATCH: 0.5}
+LIKED_OPINIONS = tuple(OPINION_WEIGHTS)
+
+LikedMovie = namedtuple('LikedMovie', ['movie_id', 'opinion', 'created_at'])
+
+
+def interacted_key(user_id):
+    return f"user_interacted:{user_id}"
+
+
+def liked_key(user_id):
+    return f"user_liked:{user_id}"
+
+
+def loaded_key(user_id):
+    # Redis drops empty sets, this tells an empty history from a history never loaded
+    return f"user_interactions_loaded:{user_id}"
+
+
+def query_interacted_ids(user_id, movie_ids=None):
+    # Every movie the user gave an opinion on, or only those of movie_ids
+    query = select(UserMovie.movie_id).where(UserMovie.user_id == user_id)
+    if movie_ids is not None:
+        query = query.where(UserMovie.movie_id.in_(movie_ids))
+    return set(db.session.scalars(query))
+
+
+def query_liked_movies(user_id):
+    return [LikedMovie(*row) for row in db.session.execute(
+        select(UserMovie.movie_id, UserMovie.opinion, UserMovie.created_at)
+        .where(UserMovie.user_id == user_id, UserMovie.opinion.in_(LIKED_OPINIONS))
+        .order_by(UserMovie.created_at.desc())
+        .limit(LIKED_MOVIES_LIMIT))]
+
+
+def load_user_interactions(user_id):
+    # Once per INTERACTIONS_CACHE_TTL, returns the liked movies
+    movie_ids, liked_movies = query_interacted_ids(user_id), query_liked_movies(user_id)
+    # Movies added meanwhile are already in the keys, they are merged and never deleted
+    pipeline = redis_client.pipeline()
+    if movie_ids:
+        pipeline.sadd(interacted_key(user_id), *movie_ids)
+    if liked_movies:
+        pipeline.zadd(liked_key(user_id), {f"{m.movie_id}:{m.opinion.name}": m.created_at.timestamp()
+                                           for m in liked_movies})
+        pipeline.zremrangebyrank(liked_key(user_id), 0, -(LIKED_MOVIES_LIMIT + 1))
+    pipeline.set(loaded_key(user_id), 1)
+    for key in (interacted_key(user_id), liked_key(user_id), loaded_key(user_id)):
+        pipeline.expire(key, INTERACTIONS_CACHE_TTL)
+    pipeline.execute()
+    return liked_movies
+
+
+def get_liked_movies(user_id):
+    # The LIKED_MOVIES_LIMIT most recent liked movies of the user, loads their interactions in Redis if needed
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.exists(loaded_key(user_id))
+        pipeline.zrevrange(liked_key(user_id), 0, -1, withscores=True)
+        loaded, liked = pipeline.execute()
+        if not loaded:
+            return load_user_interactions(user_id)
+    except redis.RedisError as e:
+        print(f"⚠️ Redis error while reading user interactions: {e}")
+        return query_liked_movies(user_id)
+
+    liked_movies = []
+    for member, score in liked:
+        movie_id, opinion = member.split(':')
+        liked_movies.append(LikedMovie(int(movie_id), Opinion[opinion], datetime.fromtimestamp(score)))
+    return liked_movies
+
+
+def get_interacted_ids(user_id, movie_ids):
+    # The movies of movie_ids the user gave an opinion on, their whole history is never read
+    if not movie_ids:
+        return set()
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.exists(loaded_key(user_id))
+        pipeline.smismember(interacted_key(user_id), movie_ids)
+        loaded, members = pipeline.execute()
+        if loaded:
+            return {movie_id for movie_id, member in zip(movie_ids, members) if member}
+    except redis.RedisError as e:
+        print(f"⚠️ Redis error while reading user interactions: {e}")
+    return query_interacted_ids(user_id, movie_ids)
+
+
+class UserExclusions:
+    # Movies a deck must skip: the movies the user gave an opinion on, checked per candidate,
+    # and movie_ids, the movies of this deck that are not stored as opinions (prefetched, served, recommended)
+    def __init__(self, user_id, movie_ids=()):
+        self.user_id = user_id
+        self.movie_ids = set(movie_ids)
+
+    def __or__(self, movie_ids):
+        return UserExclusions(self.user_id, self.movie_ids | set(movie_ids))
+
+    def filter(self, movie_ids):
+        # movie_ids without the excluded ones nor duplicates, in order
+        movie_ids = [movie_id for movie_id in dict.fromkeys(movie_ids) if movie_id not in self.movie_ids]
+        interacted_ids = get_interacted_ids(self.user_id, movie_ids)
+        return [movie_id for movie_id in movie_ids if movie_id not in interacted_ids]
+
+
+def record_user_interactions(user_id, movies):
+    # movies: [(movie_id, opinion)] just stored for the user
+    if not movies:
+        return
+    try:
+        pipeline = redis_client.pipeline()
+        pipeline.sadd(interacted_key(user_id), *[movie_id for movie_id, _ in movies])
+        pipeline.expire(interacted_key(user_id), INTERACTIONS_CACHE_TTL)
+        liked = {f"{movie_id}:{opinion.name}": time.time() for movie_id, opinion in movies if opinion in LIKED_OPINIONS}
+        if liked:
+            pipeline.zadd(liked_key(user_id), liked)
+            pipeline.zremrangebyrank(liked_key(user_id), 0, -(LIKED_MOVIES_LIMIT + 1))
+            pipeline.expire(liked_key(user_id), INTERACTIONS_CACHE_TTL)
+        pipeline.execute()
+    except redis.RedisError as e:
+        # The keys would miss these movies until they expire, drop them so they are loaded again
+        print(f"⚠️ Redis error while recording user interactions: {e}")
+        try:
+            redis_client.delete(loaded_key(user_id))
+        except redis.RedisError:
+            pass
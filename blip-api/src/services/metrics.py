@@ -0,0 +1,217 @@
+import contextvars
+import json
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import redis
+from flask import Response, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Set METRICS_TRACE_LOG=1 to log one JSON line with the spans and counters of each request
+METRICS_TRACE_LOG = os.getenv('METRICS_TRACE_LOG') == '1'
+TRACE_MAX_SPANS = 500
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Registry:
+    # Counters and histograms of this process, in memory, updates only take a lock
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets), 'sum': 0.0,
+                                                    'count': 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['counts'][i] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def render(self):
+        # Prometheus text exposition format
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: dict(histogram, counts=list(histogram['counts']))
+                          for key, histogram in self.histograms.items()}
+
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {name} counter")
+            lines += [f"{name}{format_labels(labels)} {value:g}"
+                      for (counter_name, labels), value in sorted(counters.items()) if counter_name == name]
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (histogram_name, labels), histogram in sorted(histograms.items()):
+                if histogram_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(histogram['buckets'], histogram['counts']):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram['sum']:g}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+registry = Registry()
+
+
+class RequestTrace:
+    # Spans and counters of one request, shared with the worker threads it starts
+    def __init__(self, route, method):
+        self.lock = threading.Lock()
+        self.route = route
+        self.method = method
+        self.start = time.perf_counter()
+        self.spans = []
+        self.counters = defaultdict(int)
+
+    def add_span(self, name, labels, duration):
+        with self.lock:
+            if len(self.spans) < TRACE_MAX_SPANS:
+                start = time.perf_counter() - self.start - duration
+                self.spans.append({'name': name, **labels, 'start': round(start, 4), 'duration': round(duration, 4)})
+
+    def count(self, name, value):
+        with self.lock:
+            self.counters[name] += value
+
+
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+def count(name, value=1, **labels):
+    registry.inc(f"blip_{name}_total", value, **labels)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.count(name, value)
+
+
+def record_span(name, duration, **labels):
+    registry.observe('blip_span_seconds', duration, span=name, **labels)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_span(name, labels, duration)
+
+
+@contextmanager
+def span(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start, **labels)
+
+
+class InstrumentedRedis(redis.Redis):
+    # Every command and pipeline is recorded as a redis span
+    def execute_command(self, *args, **options):
+        with span('redis', command=str(args[0]).upper()):
+            return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        pipeline = super().pipeline(transaction, shard_hint)
+        execute = pipeline.execute
+
+        def timed_execute(raise_on_error=True):
+            with span('redis', command='PIPELINE'):
+                return execute(raise_on_error)
+
+        pipeline.execute = timed_execute
+        return pipeline
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['query_start_time'].pop()
+    record_span('db', duration, statement=(statement.split(None, 1) or ['?'])[0].upper())
+
+
+@event.listens_for(Engine, 'handle_error')
+def handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_start_time'):
+        connection.info['query_start_time'].pop()
+
+
+# Trace logs are written by a background thread, requests only enqueue them
+trace_log_queue = queue.SimpleQueue()
+
+
+def write_trace_logs():
+    while True:
+        print(json.dumps(trace_log_queue.get()), flush=True)
+
+
+def before_request():
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.trace = RequestTrace(route, request.method)
+    g.trace_token = current_trace.set(g.trace)
+
+
+def after_request(response):
+    trace = g.get('trace')
+    if trace is not None:
+        # Streamed responses are finished when their last chunk is sent
+        response.call_on_close(lambda: finish_request_trace(trace, response.status_code))
+    return response
+
+
+def teardown_request(exception=None):
+    # Threads serve many requests, the next one must not inherit this trace
+    token = g.pop('trace_token', None)
+    if token is not None:
+        current_trace.reset(token)
+
+
+def finish_request_trace(trace, status):
+    duration = time.perf_counter() - trace.start
+    registry.observe('blip_request_seconds', duration, route=trace.route, method=trace.method, status=status)
+    registry.observe('blip_request_tmdb_calls', trace.counters['tmdb_calls'], buckets=COUNT_BUCKETS,
+                     route=trace.route)
+    if METRICS_TRACE_LOG:
+        trace_log_queue.put({'route': trace.route, 'method': trace.method, 'status': status,
+                             'duration': round(duration, 4), 'counters': dict(trace.counters), 'spans': trace.spans})
+
+
+def metrics_response():
+    return Response(registry.render(), mimetype=PROMETHEUS_MIMETYPE)
+
+
+def init_app(app):
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
+    if METRICS_TRACE_LOG:
+        threading.Thread(target=write_trace_logs, daemon=True).start()
@@ -0,0 +1,18 @@
+from collections import namedtuple
+
+from src.database.models import TmdbMovie
+
+# The columns needed to serve a movie, the JSONB details are only read by the recommender
+MovieRecord = namedtuple('MovieRecord', ['id', 'title', 'poster_path', 'release_date', 'vote_average', 'overview',
+                                         'runtime', 'genres', 'trailer_key', 'trailer_key_last_updated'])
+MOVIE_RECORD_COLUMNS = [TmdbMovie.__table__.c[field] for field in MovieRecord._fields]
+
+
+def parse_genres(genres):
+    return tuple(genre.strip() for genre in genres.split(',')) if genres else ()
+
+
+def movie_record(fields):
+    # fields: a row mapping or the fields of a movie, genres are parsed once here instead of on every payload
+    return MovieRecord._make(parse_genres(fields['genres']) if field == 'genres' else fields[field]
+                             for field in MovieRecord._fields)
@@ -0,0 +1,111 @@
+import os
+import re
+import threading
+import time
+
+import redis
+
+from src.app import redis_client
+from src.database import db
+from src.database.models import WatchProvider
+
+PROVIDERS_VERSION_KEY = 'watch_providers_version'
+PROVIDER_REGISTRY_CHECK_SECONDS = int(os.getenv('PROVIDER_REGISTRY_CHECK_SECONDS', 60))
+
+# Platform names sent by the app -> normalized provider names they cover
+PLATFORM_ALIASES = {
+    'netflix': ['netflix', 'netflixbasicwithads', 'netflixstandardwithads'],
+    'primevideo': ['amazonprimevideo', 'amazonprimevideowithads', 'primevideo'],
+    'disney': ['disneyplus', 'disneynow'],
+    'hbomax': ['hbomax', 'max', 'maxamazonchannel'],
+    'max': ['max', 'hbomax', 'maxamazonchannel'],
+    'appletv': ['appletvplus', 'appletv'],
+    'paramount': ['paramountplus', 'paramountpluspremium', 'paramountplusamazonchannel',
+                  'paramountplusapplechannel', 'paramountplusrokupremiumchannel'],
+    'hulu': ['hulu'],
+    'youtube': ['youtubepremium', 'youtube'],
+}
+PLATFORM_ALIASES['amazonprimevideo'] = PLATFORM_ALIASES['primevideo']
+PLATFORM_ALIASES['disneyplus'] = PLATFORM_ALIASES['disney']
+PLATFORM_ALIASES['paramountplus'] = PLATFORM_ALIASES['paramount']
+PLATFORM_ALIASES['appletvplus'] = PLATFORM_ALIASES['appletv']
+
+
+def normalize_provider_name(name):
+    return re.sub(r'[^a-z0-9]', '', name.lower().replace('+', 'plus'))
+
+
+class ProviderRegistry:
+    # Watch providers indexed by normalized name, loaded once per process and reloaded when
+    # store_watch_providers bumps the version in Redis
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.providers_by_name = None
+        self.resolved = {}
+        self.version = None
+        self.checked_at = 0
+
+    def load(self):
+        providers = db.session.query(WatchProvider.provider_id, WatchProvider.provider_name).all()
+        providers_by_name = {}
+        for provider_id, provider_name in providers:
+            providers_by_name.setdefault(normalize_provider_name(provider_name), []).append((provider_id, provider_name))
+        with self.lock:
+            self.providers_by_name = providers_by_name
+            self.resolved = {}
+        print(f"🔍 Loaded {len(providers)} watch providers in registry")
+
+    def current_version(self):
+        try:
+            return redis_client.get(PROVIDERS_VERSION_KEY)
+        except redis.RedisError:
+            return self.version
+
+    def ensure_loaded(self):
+        now = time.monotonic()
+        if self.providers_by_name is not None and now - self.checked_at < PROVIDER_REGISTRY_CHECK_SECONDS:
+            return
+        version = self.current_version()
+        if self.providers_by_name is None or version != self.version:
+            self.load()
+        self.version = version
+        self.checked_at = now
+
+    def reload(self):
+        try:
+            redis_client.incr(PROVIDERS_VERSION_KEY)
+        except redis.RedisError as e:
+            print(f"⚠️ Redis error while bumping watch providers version: {e}")
+        self.load()
+        self.version = self.current_version()
+        self.checked_at = time.monotonic()
+
+    def resolve_platform(self, platform):
+        name = normalize_provider_name(platform)
+        if name in self.resolved:
+            return self.resolved[name]
+
+        if name in PLATFORM_ALIASES:
+            names = PLATFORM_ALIASES[name]
+        elif name in self.providers_by_name:
+            names = [name]
+        else:
+            # Unknown platform, fall back to provider names starting with it
+            names = [provider_name for provider_name in self.providers_by_name if provider_name.startswith(name)]
+        providers = [provider for provider_name in names for provider in self.providers_by_name.get(provider_name, [])]
+        with self.lock:
+            self.resolved[name] = providers
+        return providers
+
+    def resolve(self, platforms):
+        # (provider_id, provider_name) of the platforms, no platform means no provider filter
+        if not platforms:
+            return []
+        self.ensure_loaded()
+        providers = {}
+        for platform in platforms:
+            providers.update(dict(self.resolve_platform(platform)))
+        return list(providers.items())
+
+
+provider_registry = ProviderRegistry()
@@ -0,0 +1,178 @@
+import math
+import os
+import threading
+import time
+from array import array
+
+import numpy as np
+from flask import current_app
+from scipy import sparse
+
+from src.database import db
+from src.database.models import TmdbMovie
+from src.services.interactions import OPINION_WEIGHTS
+
+CONTENT_INDEX_TTL = int(os.getenv('CONTENT_INDEX_TTL', 3600))
+FEATURE_WEIGHTS = {'genre': 1.0, 'keyword': 0.5, 'language': 0.5, 'vote_average': 0.3, 'popularity': 0.3}
+# log1p(popularity) is scaled so that this popularity and above count as 1
+POPULARITY_SCALE = math.log1p(1000)
+
+
+def movie_features(genres, keywords, original_language, vote_average, popularity):
+    # L2 normalized (feature, weight) pairs so that a dot product between two movies is their cosine similarity
+    features = [(f"genre:{genre.strip()}", FEATURE_WEIGHTS['genre']) for genre in (genres or '').split(',')
+                if genre.strip()]
+    features += [(f"keyword:{keyword['id']}", FEATURE_WEIGHTS['keyword']) for keyword in keywords or []]
+    if original_language:
+        features.append((f"language:{original_language}", FEATURE_WEIGHTS['language']))
+    features.append(('vote_average', FEATURE_WEIGHTS['vote_average'] * (vote_average or 0) / 10))
+    features.append(('popularity', FEATURE_WEIGHTS['popularity'] *
+                     min(math.log1p(max(popularity or 0, 0)) / POPULARITY_SCALE, 1)))
+
+    norm = math.sqrt(sum(weight * weight for _, weight in features))
+    return [(feature, weight / norm) for feature, weight in features if weight] if norm else []
+
+
+class ContentRecommender:
+    # Sparse movie x feature matrix built from tmdb_movies metadata, movies stored by this process are
+    # added incrementally and the whole index is rebuilt every CONTENT_INDEX_TTL to catch other processes
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.movie_ids = []
+        self.rows_by_movie_id = {}
+        self.features = {}
+        self.rows, self.cols, self.data = array('q'), array('q'), array('f')
+        self.matrix = None
+        self.profiles = {}
+        self.loaded_at = None
+        self.reloading = False
+
+    def add_rows(self, rows):
+        # rows: (id, genres, keywords, original_language, vote_average, popularity)
+        with self.lock:
+            for movie_id, *metadata in rows:
+                if movie_id in self.rows_by_movie_id:
+                    continue
+                row = len(self.movie_ids)
+                self.movie_ids.append(movie_id)
+                self.rows_by_movie_id[movie_id] = row
+                for feature, weight in movie_features(*metadata):
+                    self.rows.append(row)
+                    self.cols.append(self.features.setdefault(feature, len(self.features)))
+                    self.data.append(weight)
+            self.matrix = None
+
+    def add_movies(self, movies):
+        if self.loaded_at is None:
+            return
+        self.add_rows([(m.id, m.genres, m.keywords, m.original_language, m.vote_average, m.popularity)
+                       for m in movies])
+
+    def load(self):
+        # Build a new index aside and swap it in, requests keep using the current one meanwhile
+        start = time.time()
+        index = ContentRecommender()
+        index.add_rows(db.session.query(TmdbMovie.id, TmdbMovie.genres, TmdbMovie.keywords,
+                                        TmdbMovie.original_language, TmdbMovie.vote_average, TmdbMovie.popularity)
+                       .yield_per(5000))
+        index.ensure_matrix()
+        with self.lock:
+            self.movie_ids, self.rows_by_movie_id = index.movie_ids, index.rows_by_movie_id
+            self.features = index.features
+            self.rows, self.cols, self.data = index.rows, index.cols, index.data
+            self.matrix, self.profiles = index.matrix, {}
+            self.loaded_at = time.time()
+        print(f"🧮 Content index built: {len(self.movie_ids)} movies, {len(self.features)} features "
+              f"in {time.time() - start:.2f}s")
+
+    def reload_in_background(self):
+        app = current_app._get_current_object()
+
+        def reload():
+            with app.app_context():
+                try:
+                    self.load()
+                finally:
+                    self.reloading = False
+
+        threading.Thread(target=reload, daemon=True).start()
+
+    def ensure_loaded(self):
+        # The index is built in background, requests never wait for the scan of tmdb_movies.
+        # False until the first index is ready.
+        with self.lock:
+            expired = self.loaded_at is None or time.time() - self.loaded_at > CONTENT_INDEX_TTL
+            reload = expired and not self.reloading
+            if reload:
+                self.reloading = True
+        if reload:
+            self.reload_in_background()
+        return self.loaded_at is not None
+
+    def build_matrix(self):
+        # Called with the lock held
+        if self.matrix is None:
+            self.matrix = sparse.csr_matrix(
+                (np.frombuffer(self.data, dtype=np.float32),
+                 (np.frombuffer(self.rows, dtype=np.int64), np.frombuffer(self.cols, dtype=np.int64))),
+                shape=(len(self.movie_ids), len(self.features)))
+            # Profiles were computed against the previous feature columns
+            self.profiles = {}
+        return self.matrix
+
+    def ensure_matrix(self):
+        with self.lock:
+            return self.build_matrix()
+
+    def snapshot(self):
+        # The matrix with the row mappings and profiles of the same index. movie_ids and rows_by_movie_id only
+        # grow until load() swaps them, so rows past the matrix shape are movies added since and are ignored.
+        with self.lock:
+            return self.build_matrix(), self.movie_ids, self.rows_by_movie_id, self.profiles
+
+    def profile(self, user_id, liked_movies, snapshot):
+        # Weighted sum of the rows of the user's liked movies, liked_movies: [(movie_id, opinion)].
+        # Profiles are cached with the matrix they were computed from.
+        matrix, _, rows_by_movie_id, profiles = snapshot
+        cached = profiles.get(user_id)
+        if cached is not None and cached[0] is matrix:
+            return cached[1]
+
+        liked_rows = [(rows_by_movie_id[movie_id], OPINION_WEIGHTS.get(opinion, 0))
+                      for movie_id, opinion in liked_movies
+                      if rows_by_movie_id.get(movie_id, matrix.shape[0]) < matrix.shape[0]]
+        if not liked_rows:
+            return None
+        rows, weights = zip(*liked_rows)
+        selector = sparse.csr_matrix((weights, ([0] * len(rows), rows)), shape=(1, matrix.shape[0]))
+        profile = selector @ matrix
+        norm = np.sqrt(profile.multiply(profile).sum())
+        profile = profile / norm if norm else profile
+        profiles[user_id] = (matrix, profile)
+        return profile
+
+    def forget_user(self, user_id):
+        self.profiles.pop(user_id, None)
+
+    def recommend(self, user_id, liked_movies, k, excluded_ids=()):
+        # Top-k movie ids by cosine similarity with the user profile, in one sparse matrix product
+        snapshot = self.snapshot()
+        matrix, movie_ids, rows_by_movie_id, _ = snapshot
+        profile = self.profile(user_id, liked_movies, snapshot)
+        if profile is None or k <= 0:
+            return []
+
+        scores = (matrix @ profile.T).toarray().ravel()
+        excluded_rows = [rows_by_movie_id[movie_id] for movie_id in excluded_ids
+                         if rows_by_movie_id.get(movie_id, len(scores)) < len(scores)]
+        scores[excluded_rows] = -np.inf
+
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top_rows = np.argpartition(-scores, k - 1)[:k]
+        top_rows = top_rows[np.argsort(-scores[top_rows])]
+        return [movie_ids[row] for row in top_rows if scores[row] > 0]
+
+
+content_recommender = ContentRecommender()
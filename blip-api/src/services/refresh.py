@@ -0,0 +1,173 @@
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import click
+import redis
+from flask.cli import with_appcontext
+from sqlalchemy import or_, and_, case, func
+
+from src.app import redis_client
+from src.database import db
+from src.database.models import TmdbMovie, MovieWatchProvider
+from src.services.availability import STORED_REGIONS
+from src.services.metrics import count
+from src.services.write_buffer import write_buffer
+
+REFRESH_QUEUE_KEY = 'refresh_queue'
+REFRESH_BATCH_SIZE = int(os.getenv('REFRESH_BATCH_SIZE', 20))
+REFRESH_SCHEDULE_SIZE = int(os.getenv('REFRESH_SCHEDULE_SIZE', 500))
+REFRESH_LOCALE = os.getenv('REFRESH_LOCALE', 'FR')
+REFRESH_IDLE_SECONDS = int(os.getenv('REFRESH_IDLE_SECONDS', 30))
+# Stored data is refreshed daily, except a missing trailer which is rarely added later
+REFRESH_INTERVAL = timedelta(days=1)
+NO_TRAILER_RETRY_AFTER = timedelta(days=int(os.getenv('NO_TRAILER_RETRY_DAYS', 7)))
+
+
+def enqueue_refresh(movie_ids, locale):
+    # Served movies are scored with the current timestamp so they always come before the
+    # scheduler picks, which are scored with their popularity
+    if not movie_ids:
+        return
+    count('refreshes_enqueued', len(movie_ids))
+    try:
+        redis_client.zadd(REFRESH_QUEUE_KEY, {f"{movie_id}:{locale}": time.time() for movie_id in movie_ids}, gt=True)
+    except redis.RedisError as e:
+        print(f"⚠️ Redis error while enqueuing refresh: {e}")
+
+
+def providers_stale_date(providers_last_updated):
+    if providers_last_updated is None:
+        return None
+    return providers_last_updated + REFRESH_INTERVAL
+
+
+def trailer_stale_date(movie):
+    if movie.trailer_key_last_updated is None:
+        return None
+    return movie.trailer_key_last_updated + (NO_TRAILER_RETRY_AFTER if movie.trailer_key is None else REFRESH_INTERVAL)
+
+
+def is_providers_stale(providers_last_updated, today):
+    stale_date = providers_stale_date(providers_last_updated)
+    return stale_date is None or stale_date <= today
+
+
+def is_trailer_stale(movie, today):
+    stale_date = trailer_stale_date(movie)
+    return stale_date is None or stale_date <= today
+
+
+def is_stale(movie, providers_last_updated, today):
+    return is_providers_stale(providers_last_updated, today) or is_trailer_stale(movie, today)
+
+
+def schedule_stale_movies(limit, locale=REFRESH_LOCALE):
+    # One entry per movie, limit counts movies. A refresh stores STORED_REGIONS with its own region,
+    # so a stale region outside of them is picked when there is one.
+    today = datetime.now().date()
+    other_region = case((MovieWatchProvider.region.in_(STORED_REGIONS), None), else_=MovieWatchProvider.region)
+    stale_providers = (db.session.query(MovieWatchProvider.movie_id,
+                                        func.coalesce(func.min(other_region), func.min(MovieWatchProvider.region)),
+                                        TmdbMovie.popularity)
+                       .join(TmdbMovie, TmdbMovie.id == MovieWatchProvider.movie_id)
+                       .filter(MovieWatchProvider.last_updated <= today - REFRESH_INTERVAL)
+                       .group_by(MovieWatchProvider.movie_id, TmdbMovie.popularity)
+                       .order_by(TmdbMovie.popularity.desc().nullslast())
+                       .limit(limit)
+                       .all())
+    stale_trailers = (db.session.query(TmdbMovie.id, TmdbMovie.popularity)
+                      .filter(or_(and_(TmdbMovie.trailer_key.isnot(None),
+                                       TmdbMovie.trailer_key_last_updated <= today - REFRESH_INTERVAL),
+                                  and_(TmdbMovie.trailer_key.is_(None),
+                                       TmdbMovie.trailer_key_last_updated <= today - NO_TRAILER_RETRY_AFTER)))
+                      .order_by(TmdbMovie.popularity.desc().nullslast())
+                      .limit(limit)
+                      .all())
+    # A refresh also renews a stale trailer, whatever its region
+    members = {movie_id: (f"{movie_id}:{region}", popularity) for movie_id, region, popularity in stale_providers}
+    for movie_id, popularity in stale_trailers:
+        members.setdefault(movie_id, (f"{movie_id}:{locale}", popularity))
+    scores = {member: popularity or 0 for member, popularity in members.values()}
+    if scores:
+        redis_client.zadd(REFRESH_QUEUE_KEY, scores, gt=True)
+    print(f"🗓️ Scheduled {len(scores)} stale movies for refresh")
+    return len(scores)
+
+
+def refresh_movies(movie_ids, locale):
+    from src.services.availability import get_movies_availability
+    from src.services.tmdb import (fetch_and_store_movie_watch_providers, fetch_and_store_trailer_keys,
+                                   get_stored_movies)
+
+    today = datetime.now().date()
+    movies = list(get_stored_movies(movie_ids).values())
+    availability = get_movies_availability(movie_ids, locale)
+    fetch_and_store_movie_watch_providers(
+        [m for m in movies if is_providers_stale(availability.get(m.id, {}).get('last_updated'), today)], locale)
+    fetch_and_store_trailer_keys([m for m in movies if is_trailer_stale(m, today)])
+    write_buffer.flush()
+
+
+def refresh_next_batch(batch_size=REFRESH_BATCH_SIZE, failed=None):
+    # failed: {member: score} collecting the popped entries whose refresh raised, for the caller to enqueue again
+    entries = redis_client.zpopmax(REFRESH_QUEUE_KEY, batch_size)
+    entries_by_locale = defaultdict(dict)
+    for member, score in entries:
+        entries_by_locale[member.split(':')[1]][member] = score
+
+    for locale, locale_entries in entries_by_locale.items():
+        movie_ids = [int(member.split(':')[0]) for member in locale_entries]
+        try:
+            refresh_movies(movie_ids, locale)
+        except Exception as e:
+            # ZPOPMAX already removed them, one failing batch must not lose them nor stop the worker
+            print(f"⚠️ Refresh of {len(movie_ids)} movies for {locale} failed: {e}")
+            db.session.rollback()
+            count('refresh_errors', len(movie_ids), locale=locale)
+            if failed is not None:
+                failed.update(locale_entries)
+            continue
+        count('refreshes', len(movie_ids), locale=locale)
+        print(f"🔄 Refreshed {len(movie_ids)} movies for {locale}")
+    db.session.remove()
+    return len(entries)
+
+
+def requeue_failed(failed):
+    # Enqueued again once the round is over, so that a movie failing every time can't loop within a round
+    if not failed:
+        return
+    try:
+        redis_client.zadd(REFRESH_QUEUE_KEY, failed, gt=True)
+        print(f"↩️ Enqueued {len(failed)} failed refreshes again")
+    except redis.RedisError as e:
+        print(f"⚠️ Redis error while enqueuing failed refreshes: {e}")
+
+
+@click.command('refresh-worker')
+@click.option('--batch-size', default=REFRESH_BATCH_SIZE, help='Movies refreshed per batch.')
+@click.option('--schedule-size', default=REFRESH_SCHEDULE_SIZE, help='Stale movies scheduled per round.')
+@click.option('--locale', default=REFRESH_LOCALE, help='Locale used for scheduled refreshes.')
+@click.option('--once', is_flag=True, help='Run a single round and exit.')
+@with_appcontext
+def refresh_worker_command(batch_size, schedule_size, locale, once):
+    print("🔄 Refresh worker started")
+    while True:
+        failed = {}
+        try:
+            scheduled = schedule_stale_movies(schedule_size, locale)
+            while refresh_next_batch(batch_size, failed):
+                pass
+        except Exception as e:
+            # Redis or the database is unreachable, the worker waits and tries again
+            print(f"⚠️ Refresh round failed: {e}")
+            db.session.remove()
+            scheduled = 0
+        requeue_failed(failed)
+        if once:
+            break
+        # Movies that failed to refresh are retried next round, wait when we are not catching up
+        if scheduled < schedule_size:
+            time.sleep(REFRESH_IDLE_SECONDS)
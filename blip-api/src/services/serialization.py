@@ -0,0 +1,19 @@
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+
+def dumps(obj):
+    # bytes, types orjson doesn't know fall back to Flask's conversions
+    return orjson.dumps(obj, default=DefaultJSONProvider.default, option=orjson.OPT_NON_STR_KEYS)
+
+
+loads = orjson.loads
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    # jsonify and dict responses are serialized by orjson, keys are no longer sorted
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return loads(s)
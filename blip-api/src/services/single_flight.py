@@ -0,0 +1,110 @@
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError
+
+import redis
+
+from src.app import redis_client
+from src.services.deadline import bounded_timeout, remaining_seconds
+
+# A lease outlives the slowest TMDB call (timeout and retries) so that a single process fetches at a time
+SINGLE_FLIGHT_LEASE_SECONDS = float(os.getenv('SINGLE_FLIGHT_LEASE_SECONDS', 30))
+SINGLE_FLIGHT_WAIT_SECONDS = float(os.getenv('SINGLE_FLIGHT_WAIT_SECONDS', 10))
+SINGLE_FLIGHT_POLL_SECONDS = 0.05
+# Results are kept just long enough for the processes waiting on the lease to read them
+SINGLE_FLIGHT_RESULT_TTL = int(os.getenv('SINGLE_FLIGHT_RESULT_TTL', 30))
+
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    # Only one fetch per key is in flight: threads of this process share a future,
+    # other processes wait on a Redis lease and read the result the lease holder published
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.release_lease_script = redis_client.register_script(RELEASE_LEASE_SCRIPT)
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def run(self, key, fetch, *args, **kwargs):
+        with self.lock:
+            future = self.flights.get(key)
+            leader = future is None
+            if leader:
+                future = self.flights[key] = Future()
+        if not leader:
+            try:
+                remaining = remaining_seconds()
+                return future.result(timeout=None if remaining is None else max(remaining, 0))
+            except TimeoutError:
+                # Same as a failed fetch for a request out of budget, the leader still completes the fetch
+                print(f"⏱️ Stopped waiting for {key}, request deadline exceeded")
+                return None
+
+        try:
+            result = self.run_across_processes(key, fetch, *args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+
+    def run_across_processes(self, key, fetch, *args, **kwargs):
+        lease_key, result_key = f"single_flight:lease:{key}", f"single_flight:result:{key}"
+        token = uuid.uuid4().hex
+        wait_until = time.monotonic() + bounded_timeout(SINGLE_FLIGHT_WAIT_SECONDS)
+        while True:
+            try:
+                result = self.redis_client.get(result_key)
+                if result is not None:
+                    return json.loads(result)
+                if self.redis_client.set(lease_key, token, nx=True, px=int(SINGLE_FLIGHT_LEASE_SECONDS * 1000)):
+                    break
+            except redis.RedisError as e:
+                # Never block TMDB calls because Redis is down
+                print(f"⚠️ Redis error in single flight {key}: {e}")
+                return fetch(*args, **kwargs)
+            if time.monotonic() > wait_until:
+                print(f"⚠️ Gave up waiting for {key} fetched by another process")
+                return fetch(*args, **kwargs)
+            time.sleep(SINGLE_FLIGHT_POLL_SECONDS)
+
+        try:
+            result = fetch(*args, **kwargs)
+            # Failures are not published, waiting processes fetch again once the lease is released
+            if result is not None:
+                self.redis_client.set(result_key, json.dumps(result), ex=SINGLE_FLIGHT_RESULT_TTL)
+            return result
+        finally:
+            try:
+                self.release_lease_script(keys=[lease_key], args=[token])
+            except redis.RedisError as e:
+                print(f"⚠️ Redis error while releasing lease {key}: {e}")
+
+
+flights = SingleFlight(redis_client)
+
+
+def single_flight(resource):
+    # Decorates a TMDB fetch whose result is JSON serializable, the key is the resource and the arguments
+    def decorator(fetch):
+        @functools.wraps(fetch)
+        def wrapper(*args, **kwargs):
+            key = ':'.join([resource, *map(str, args), *(f"{name}={value}" for name, value in sorted(kwargs.items()))])
+            return flights.run(key, fetch, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -1,28 +1,109 @@
+import contextvars
+import itertools
 import os
 import random
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-from sqlalchemy import or_
-
-import requests
-from flask import jsonify
+from flask import jsonify, current_app, Response, stream_with_context
 
 from src.app import redis_client
-from src.utils import extract_trailer_key
-from src.database.models import User, UserMovie, TmdbMovie, WatchProvider
-from src.database.types import Opinion
+from src.services.cache import (get_cached_movies, cache_movies, invalidate_movies, seconds_until_stale,
+                                get_tmdb_json_cached, mark_negative, get_unusable_movie_ids, NOT_FOUND, NO_POSTER)
+from src.services.availability import get_movies_availability, store_movies_availability
+from src.services.discovery import iter_local_movies
+from src.services.feed import (discover_feed_params, pop_feed, get_feed_ids, push_feed, acquire_prefetch_lock,
+                               release_prefetch_lock)
+from src.services.interactions import get_liked_movies, UserExclusions
+from src.services.deadline import current_deadline, deadline_at, deadline_exceeded
+from src.services.metrics import current_trace, span, count as count_metric
+from src.services.movie_records import MOVIE_RECORD_COLUMNS, movie_record
+from src.services.providers import provider_registry
+from src.services.collaborative import get_collaborative_recommendations
+from src.services.recommender import content_recommender
+from src.services.serialization import dumps
+from src.services.single_flight import single_flight
+from src.services.refresh import enqueue_refresh, is_stale, providers_stale_date, trailer_stale_date
+from src.services.tmdb_client import tmdb_client
+from src.services.write_buffer import write_buffer
+from src.utils import extract_trailer_key, extract_regions_providers_ids
+from src.database.models import User, TmdbMovie, WatchProvider
 from src.database import db
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 import time
 
-TMDB_URL = os.getenv('TMDB_URL')
-TMDB_BEARER_TOKEN = os.getenv('TMDB_BEARER_TOKEN')
-HEADERS = {'Authorization': f"Bearer {TMDB_BEARER_TOKEN}"}
+TMDB_MAX_CONCURRENCY = int(os.getenv('TMDB_MAX_CONCURRENCY', 8))
+RECOMMENDED_MOVIES_LIMIT = 8
+DISCOVER_MOVIES_LIMIT = 20
+# Recommendation sources tried in order until RECOMMENDED_MOVIES_LIMIT movies are found
+RECOMMENDATION_SOURCES = os.getenv('RECOMMENDATION_SOURCES', 'collaborative,content,tmdb').split(',')
+COLLABORATIVE_LIKED_MOVIES_LIMIT = 50
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# Time a discover request may take, clients can pass budget_ms up to DISCOVER_MAX_BUDGET_SECONDS.
+# Once spent the movies enriched so far are served, the feed prefetch completes the deck in background.
+DISCOVER_BUDGET_SECONDS = float(os.getenv('DISCOVER_BUDGET_SECONDS', 3))
+DISCOVER_MAX_BUDGET_SECONDS = float(os.getenv('DISCOVER_MAX_BUDGET_SECONDS', 10))
+# The first chunk of a streamed deck is this small so that its first card doesn't wait on a whole chunk of TMDB calls
+STREAM_FIRST_CHUNK_SIZE = int(os.getenv('STREAM_FIRST_CHUNK_SIZE', 2))
+# Set while a streamed deck has yielded no card yet, its chunks are then STREAM_FIRST_CHUNK_SIZE movies at most
+first_chunk_pending = contextvars.ContextVar('first_chunk_pending', default=False)
+
+executor = ThreadPoolExecutor(max_workers=TMDB_MAX_CONCURRENCY)
+# Prefetches run apart from executor, they submit TMDB fetches to it and wait for them
+prefetch_executor = ThreadPoolExecutor(max_workers=int(os.getenv('DISCOVER_PREFETCH_WORKERS', 2)))
+
+
+def run_concurrently(func, items, *args):
+    # Each worker needs its own app context (and so its own db session), its spans go to the request trace
+    # and its TMDB calls share the deadline of the request
+    app = current_app._get_current_object()
+    trace = current_trace.get()
+    deadline = current_deadline.get()
+
+    def run(item):
+        token = current_trace.set(trace)
+        try:
+            with app.app_context(), deadline_at(deadline):
+                return func(item, *args)
+        finally:
+            current_trace.reset(token)
+
+    # executor.map keeps the order of items
+    return list(executor.map(run, items))
+
+
+def next_chunk_size(chunk_size):
+    return min(chunk_size, STREAM_FIRST_CHUNK_SIZE) if first_chunk_pending.get() else chunk_size
+
+
+def iter_enriched_movies(movie_ids, limit, providers, locale='FR'):
+    # Enrich by chunks to avoid wasting TMDB calls once the limit is reached or the deadline passed,
+    # yields each enriched chunk
+    count = 0
+    i = 0
+    while i < len(movie_ids) and count < limit and not deadline_exceeded():
+        chunk_size = next_chunk_size(max(limit - count, TMDB_MAX_CONCURRENCY))
+        movies = get_movies(movie_ids[i:i + chunk_size], providers, locale)[:limit - count]
+        count += len(movies)
+        i += chunk_size
+        yield movies
+
+
+def enrich_movies(movie_ids, limit, providers, locale='FR'):
+    return [movie for movies in iter_enriched_movies(movie_ids, limit, providers, locale) for movie in movies]
+
+
+def discover_budget(budget_ms):
+    if not budget_ms or budget_ms <= 0:
+        return DISCOVER_BUDGET_SECONDS
+    return min(budget_ms / 1000, DISCOVER_MAX_BUDGET_SECONDS)
 
 
 def discover_movies(request):
     # Evaluate response time
     start = time.time()
+    deadline = time.monotonic() + discover_budget(request.args.get('budget_ms', type=int))
 
     user_id = request.args.get('user_id', type=int)
     if not user_id:
@@ -32,50 +113,41 @@ def discover_movies(request):
     platforms = [platform.strip() for platform in platforms_param.split(',') if platform]
 
     locale = request.args.get('locale', 'FR')
+    # Old clients get the whole deck as a JSON array
+    stream = (request.args.get('stream') == '1' or
+              request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE)
 
     with Session(db.engine) as session:
         user = session.get(User, user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
-        user_movies = session.query(UserMovie).filter(UserMovie.user_id == user_id).all()
-        user_interacted_ids = {um.movie_id for um in user_movies}
-
-        provider_filters = [WatchProvider.provider_name.ilike(f"%{provider}%") for provider in platforms]
-        providers = session.query(WatchProvider.provider_id, WatchProvider.provider_name).filter(or_(*provider_filters)).all()
+    liked_movies = get_liked_movies(user_id)
 
-    liked_movies = [um for um in user_movies if
-                    um.opinion in [Opinion(Opinion.LOVED_IT), Opinion(Opinion.WANT_TO_WATCH)]]
+    providers = provider_registry.resolve(platforms)
 
-    # Fetch recommended movies
-    recommended_movies = []
-    if liked_movies:
-        random.shuffle(liked_movies)
-        for user_movie in liked_movies:
-            if len(recommended_movies) >= 16:
-                break
-            reco_url = f"{TMDB_URL}/3/movie/{user_movie.movie_id}/recommendations"
-            reco_res = requests.get(reco_url, headers=HEADERS)
-            if reco_res.status_code == 200:
-                reco_json = reco_res.json()
-                print(
-                    f"- Recommendation for movie: {user_movie.movie_id}, results: {len(reco_json.get('results', []))}")
-                for reco in reco_json.get('results', []):
-                    if len(recommended_movies) >= 8:
-                        break
-                    if user_interacted_ids and reco['id'] in user_interacted_ids:
-                        continue
-                    enriched_recommended_movie = get_movie(reco['id'], providers, locale)
-                    if enriched_recommended_movie:
-                        recommended_movies.append(enriched_recommended_movie)
+    # The deck prefetched after the previous request is served first, only what it lacks is computed now
+    feed_params = discover_feed_params(providers, locale)
+    feed_movies = pop_feed(user_id, feed_params, DISCOVER_MOVIES_LIMIT)
+    # Movies rated since they were prefetched are skipped, the user's history is never loaded whole
+    feed_ids = set(UserExclusions(user_id).filter([movie['id'] for movie in feed_movies]))
+    feed_movies = [movie for movie in feed_movies if movie['id'] in feed_ids]
+    exclusions = UserExclusions(user_id, feed_ids)
+    n = DISCOVER_MOVIES_LIMIT - len(feed_movies)
 
+    if stream:
+        return stream_discover_deck(start, deadline, user_id, feed_movies, n, exclusions, liked_movies, providers,
+                                    locale, feed_params)
 
-    random_movies = fetch_random_popular_movies(n=20 - len(recommended_movies), providers=providers, locale=locale,
-                                                excluded_ids=user_interacted_ids, user_id=user_id)
+    with deadline_at(deadline):
+        recommended_movies, random_movies = build_discover_deck(user_id, n, exclusions, liked_movies, providers,
+                                                                locale)
 
-
-    final_movies = recommended_movies + random_movies
+    final_movies = feed_movies + recommended_movies + random_movies
+    record_partial_deck(user_id, len(final_movies), deadline)
+    schedule_feed_prefetch(user_id, feed_params, {movie['id'] for movie in final_movies}, providers, locale)
 
     print("==============")
+    print("- Number of prefetched movies:", len(feed_movies))
     print("- Number of recommended movies:", len(recommended_movies))
     print("- Number of random movies:", len(random_movies))
     print("- Number of enriched movies:", len(final_movies))
@@ -86,164 +158,336 @@ def discover_movies(request):
     return jsonify(final_movies), 200
 
 
-def fetch_random_popular_movies(n, user_id, excluded_ids, providers, locale='FR'):
-    movies = []
-    page = int(redis_client.get(f"random_page_{user_id}") or 1)
+def stream_discover_deck(start, deadline, user_id, feed_movies, n, exclusions, liked_movies, providers, locale,
+                         feed_params):
+    # One JSON movie per line, written as soon as its chunk is enriched, the first chunk is a small one
+    def generate():
+        served_ids = set()
+        chunks = itertools.chain([('prefetched', feed_movies)],
+                                 iter_discover_deck(user_id, n, exclusions, liked_movies, providers, locale))
+        with deadline_at(deadline):
+            token = first_chunk_pending.set(not feed_movies)
+            try:
+                for _, movies in chunks:
+                    for movie in movies:
+                        if not served_ids:
+                            print(f"🕒 First movie after: {time.time() - start:.2f}s")
+                            first_chunk_pending.set(False)
+                        served_ids.add(movie['id'])
+                        yield dumps(movie) + b'\n'
+            finally:
+                first_chunk_pending.reset(token)
+        record_partial_deck(user_id, len(served_ids), deadline)
+        schedule_feed_prefetch(user_id, feed_params, served_ids, providers, locale)
+        print(f"🕒 Total elapsed time: {time.time() - start:.2f}s for {len(served_ids)} streamed movies")
+
+    # Proxies must not buffer the stream
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE,
+                    headers={'X-Accel-Buffering': 'no'})
+
+
+def record_partial_deck(user_id, served_count, deadline):
+    # The movies the request had no time for are part of the next deck, computed by the feed prefetch
+    if served_count < DISCOVER_MOVIES_LIMIT and time.monotonic() >= deadline:
+        count_metric('discover_partial_decks')
+        print(f"⏱️ Discover budget spent for user {user_id}, {served_count} movies served")
+
+
+def iter_discover_deck(user_id, n, exclusions, liked_movies, providers, locale='FR'):
+    # Yields ('recommended' | 'random', movies) chunks, recommended movies first, n movies at most.
+    # exclusions: a UserExclusions
+    if n <= 0:
+        return
+    recommended_ids = set()
+    for movies in iter_recommended_movies(user_id, liked_movies, exclusions, providers, locale):
+        movies = movies[:n - len(recommended_ids)]
+        recommended_ids.update(movie['id'] for movie in movies)
+        yield 'recommended', movies
+        if len(recommended_ids) >= n:
+            return
+    exclusions = exclusions | recommended_ids
+    for movies in iter_random_popular_movies(n - len(recommended_ids), user_id, exclusions, providers, locale):
+        yield 'random', movies
+
+
+def build_discover_deck(user_id, n, exclusions, liked_movies, providers, locale='FR'):
+    # (recommended movies, random popular movies), n movies at most
+    recommended_movies, random_movies = [], []
+    for kind, movies in iter_discover_deck(user_id, n, exclusions, liked_movies, providers, locale):
+        (recommended_movies if kind == 'recommended' else random_movies).extend(movies)
+    return recommended_movies, random_movies
+
+
+def prefetch_discover_feed(user_id, feed_params, served_ids, providers, locale='FR'):
+    # Computes the next deck of the user while they swipe the current one
+    if not acquire_prefetch_lock(user_id):
+        return
+    try:
+        queued_ids = get_feed_ids(user_id)
+        n = DISCOVER_MOVIES_LIMIT - len(queued_ids)
+        if n <= 0:
+            return
+        liked_movies = get_liked_movies(user_id)
+        exclusions = UserExclusions(user_id, queued_ids | served_ids)
+        recommended_movies, random_movies = build_discover_deck(user_id, n, exclusions, liked_movies, providers,
+                                                                locale)
+        push_feed(user_id, feed_params, recommended_movies + random_movies)
+        print(f"📥 Prefetched {len(recommended_movies) + len(random_movies)} movies for user {user_id}")
+    finally:
+        release_prefetch_lock(user_id)
+
+
+def schedule_feed_prefetch(user_id, feed_params, served_ids, providers, locale='FR'):
+    app = current_app._get_current_object()
+
+    def prefetch():
+        with app.app_context():
+            try:
+                prefetch_discover_feed(user_id, feed_params, served_ids, providers, locale)
+            except Exception as e:
+                print(f"⚠️ Discover feed prefetch failed for user {user_id}: {e}")
+
+    prefetch_executor.submit(prefetch)
+
+
+def iter_recommended_movies(user_id, liked_movies, exclusions, providers, locale='FR'):
+    # Yields the enriched chunks of each recommendation source, RECOMMENDED_MOVIES_LIMIT movies at most
+    if not liked_movies:
+        return
+
+    count = 0
+    # Known without Redis: the candidates rated by the user are filtered per source by exclusions
+    seen_ids = exclusions.movie_ids | {um.movie_id for um in liked_movies}
+    for source in RECOMMENDATION_SOURCES:
+        if count >= RECOMMENDED_MOVIES_LIMIT or deadline_exceeded():
+            return
+        if source == 'collaborative':
+            recent_liked_ids = [um.movie_id for um in sorted(liked_movies, key=lambda um: um.created_at, reverse=True)]
+            candidate_ids = get_collaborative_recommendations(recent_liked_ids[:COLLABORATIVE_LIKED_MOVIES_LIMIT],
+                                                              k=RECOMMENDED_MOVIES_LIMIT * 4, excluded_ids=seen_ids)
+        elif source == 'content':
+            if not content_recommender.ensure_loaded():
+                continue
+            candidate_ids = content_recommender.recommend(user_id, [(um.movie_id, um.opinion) for um in liked_movies],
+                                                          k=RECOMMENDED_MOVIES_LIMIT * 4, excluded_ids=seen_ids)
+        else:
+            continue
+        candidate_ids = exclusions.filter(candidate_ids)
+        for movies in iter_enriched_movies(candidate_ids, RECOMMENDED_MOVIES_LIMIT - count, providers, locale):
+            seen_ids |= {movie['id'] for movie in movies}
+            count += len(movies)
+            yield movies
+
+    if 'tmdb' not in RECOMMENDATION_SOURCES:
+        return
+
+    liked_movies = random.sample(liked_movies, len(liked_movies))
+    for i in range(0, len(liked_movies), TMDB_MAX_CONCURRENCY):
+        if count >= RECOMMENDED_MOVIES_LIMIT or deadline_exceeded():
+            return
+        liked_ids = [um.movie_id for um in liked_movies[i:i + TMDB_MAX_CONCURRENCY]]
+        candidate_ids = []
+        for recommendations in run_concurrently(fetch_movie_recommendations, liked_ids):
+            for reco in recommendations:
+                if reco['id'] not in seen_ids:
+                    seen_ids.add(reco['id'])
+                    candidate_ids.append(reco['id'])
+        candidate_ids = exclusions.filter(candidate_ids)
+        for movies in iter_enriched_movies(candidate_ids, RECOMMENDED_MOVIES_LIMIT - count, providers, locale):
+            count += len(movies)
+            yield movies
+
+
+def iter_random_popular_movies(n, user_id, exclusions, providers, locale='FR'):
+    providers_ids = [provider_id for provider_id, _ in providers]
+
+    # Serve from our catalog first, TMDB only backfills when the local pool runs dry
+    count = 0
+    for movies in iter_local_movies(n, user_id, exclusions, providers, providers_ids, locale):
+        exclusions = exclusions | {movie['id'] for movie in movies}
+        count += len(movies)
+        yield movies
+    if count < n:
+        yield from iter_tmdb_popular_movies(n - count, user_id, exclusions, providers, providers_ids, locale)
+
+
+def popular_cursor_key(user_id):
+    return f"random_page_{user_id}"
+
+
+def get_popular_cursor(user_id):
+    # (TMDB discover page, position in its results) where the popular movies of the user resume
+    page, _, offset = (redis_client.get(popular_cursor_key(user_id)) or '1').partition(':')
+    return int(page), int(offset or 0)
+
+
+def iter_tmdb_popular_movies(n, user_id, exclusions, providers, providers_ids, locale='FR'):
+    count = 0
+    page, offset = get_popular_cursor(user_id)
     max_pages = page + 10
 
-    with Session(db.engine) as session:
-        # TODO: IMPROVE case paramount +, DisneyNow
-        provider_filters = [WatchProvider.provider_name.ilike(f"%{provider}%") for provider in providers]
-        providers_ids = session.query(WatchProvider.provider_id).filter(or_(*provider_filters)).all()
-        providers_ids = [p[0] for p in providers_ids]
-        print(f"🔍 Found {len(providers_ids)} providers in db")
-
-    while len(movies) < n and page <= max_pages:
-        print(f"📡 Fetching page {page} | Providers: {providers}")
-        params = {
-            'language': f"{locale.lower()}-{locale.upper()}",
-            'page': page,
-            'sort_by': 'popularity.desc',
-            'watch_region': locale.upper(),
-        }
-
-        if providers:
-            params['with_watch_providers'] = '|'.join(map(str, providers_ids))
-
-        popular_url = f"{os.getenv('TMDB_URL')}/3/discover/movie"
-        resp = requests.get(popular_url, headers=HEADERS, params=params)
-
-        if resp.status_code != 200:
-            print(f"⚠️ Error TMDb: {resp.status_code} - {resp.text}")
-            break
-
-        results = resp.json().get('results', [])
-        ids_page = {m['id'] for m in results}
-        ids_page -= excluded_ids
-
-        for movie_id in ids_page:
-            movie = get_movie(movie_id, providers, locale)
-            if movie:
-                movies.append(movie)
-        page += 1
-
-    redis_client.set(f"random_page_{user_id}", page, ex=86400)
-
-    return movies
-
+    try:
+        while count < n and page <= max_pages and not deadline_exceeded():
+            print(f"📡 Fetching page {page} | Providers: {providers}")
+            params = {
+                'language': f"{locale.lower()}-{locale.upper()}",
+                'page': page,
+                'sort_by': 'popularity.desc',
+                'watch_region': locale.upper(),
+            }
+
+            if providers:
+                params['with_watch_providers'] = '|'.join(map(str, sorted(providers_ids)))
+
+            discover_json = get_tmdb_json_cached("/3/discover/movie", params=params)
+            if discover_json is None:
+                break
 
-def fetch_movie_providers(movie_id, locale='FR'):
-    watch_providers_url = f"{TMDB_URL}/3/movie/{movie_id}/watch/providers"
-    watch_response = requests.get(watch_providers_url, headers=HEADERS)
-    watch_providers = {}
-    if watch_response.status_code == 200:
-        watch_providers = watch_response.json().get('results', {}).get(locale, {})
-
-    available_platforms = []
-    if 'flatrate' in watch_providers:
-        available_platforms = [(p['provider_name'], p['provider_id']) for p in watch_providers['flatrate']]
-
-    if 'Netflix basic with Ads' in [p[0] for p in available_platforms]:
-        available_platforms = [(p[0].replace('Netflix basic with Ads', 'Netflix'), p[1]) for p in available_platforms]
-    if 'Amazon Prime Video' in [p[0] for p in available_platforms]:
-        available_platforms = [(p[0].replace('Amazon Prime Video', 'Prime Video'), p[1]) for p in available_platforms]
-
-    return available_platforms
-
-
-def fetch_and_store_trailer_key(movie_id):
-    base_url = f"{TMDB_URL}/3/movie/"
-    trailer_response = requests.get(f"{base_url}{movie_id}/videos", headers=HEADERS)
-    if trailer_response.status_code == 200:
-        trailer_key = extract_trailer_key(trailer_response)
-        # Store result in DB
-        db.session.query(TmdbMovie).filter(TmdbMovie.id == movie_id).update({'trailer_key': trailer_key,
-                                                                            'trailer_key_last_updated': datetime.now()})
-        db.session.commit()
-        print(f"🗄️ Stored Trailer Key for movie: {movie_id}")
-        return trailer_key
-    else:
-        print(f"Error fetching trailer key for movie {movie_id}")
-        return None
+            results = discover_json.get('results', [])
+            positions = {m['id']: position for position, m in enumerate(results)}
+            ids_page = exclusions.filter([m['id'] for m in results[offset:]])
+
+            for movies in iter_enriched_movies(ids_page, n - count, providers, locale):
+                if movies:
+                    # The movies of the page after the last one served are served by the next deck
+                    offset = max(positions[movie['id']] for movie in movies) + 1
+                count += len(movies)
+                yield movies
+            if count < n and not deadline_exceeded():
+                # Every movie of the page was tried
+                page, offset = page + 1, 0
+    finally:
+        # Also saved when a streamed response stops early
+        redis_client.set(popular_cursor_key(user_id), f"{page}:{offset}", ex=86400)
+
+
+def fetch_movie_recommendations(movie_id):
+    reco_json = get_tmdb_json_cached(f"/3/movie/{movie_id}/recommendations")
+    if reco_json is None:
+        return []
+    results = reco_json.get('results', [])
+    print(f"- Recommendation for movie: {movie_id}, results: {len(results)}")
+    return results
 
 
-def fetch_and_store_movie_details(movie_id):
-    url = f"{TMDB_URL}/3/movie/{movie_id}"
-    response = requests.get(url, headers=HEADERS)
-    if response.status_code == 200:
-        response_json = response.json()
-        # Store result in db
-        movie = TmdbMovie(
-            id=response_json.get('id'),
-            title=response_json.get('title'),
-            vote_average=response_json.get('vote_average'),
-            vote_count=response_json.get('vote_count'),
-            status=response_json.get('status'),
-            release_date=response_json.get('release_date'),
-            revenue=response_json.get('revenue'),
-            runtime=response_json.get('runtime'),
-            adult=response_json.get('adult'),
-            backdrop_path=response_json.get('backdrop_path'),
-            budget=response_json.get('budget'),
-            homepage=response_json.get('homepage'),
-            imdb_id=response_json.get('imdb_id'),
-            original_language=response_json.get('original_language'),
-            original_title=response_json.get('original_title'),
-            overview=response_json.get('overview'),
-            popularity=response_json.get('popularity'),
-            poster_path=response_json.get('poster_path'),
-            tagline=response_json.get('tagline'),
-            genres=','.join([genre['name'] for genre in response_json.get('genres')]),
-            production_companies=response_json.get('production_companies'),
-            production_countries=response_json.get('production_countries'),
-            spoken_languages=response_json.get('spoken_languages'),
-            keywords=response_json.get('keywords'),
-        )
-        db.session.add(movie)
-        db.session.commit()
-        print(f"🗄️ Stored Movie Details of movie: {movie.id}")
-        return movie
-    else:
-        print(f"⚠️ TMDB Error while fetching movie details: {response.status_code} - {response.text}")
-        return None
+@single_flight('watch_providers')
+def fetch_movie_watch_providers(movie_id):
+    return tmdb_client.get_json(f"/3/movie/{movie_id}/watch/providers")
 
-def fetch_and_store_movie_watch_providers(movie_id, locale):
-    available_platforms = fetch_movie_providers(movie_id, locale)
-    watch_providers_ids = [p[1] for p in available_platforms]
-    db.session.query(TmdbMovie).filter(TmdbMovie.id == movie_id).update(
-        {'watch_providers_ids': watch_providers_ids, 'watch_providers_last_updated': datetime.now()})
-    db.session.commit()
-    print(f"🗄️ Stored Watch Providers for movie {movie_id}")
-    return watch_providers_ids
 
-def get_movie(movie_id, selected_providers, locale='FR'):
-    movie = db.session.query(TmdbMovie).get(movie_id)
-    if not movie:
-        movie = fetch_and_store_movie_details(movie_id)
-        if not movie:
-            print(f"⚠️ Error fetching movie {movie_id}")
-            return None
+@single_flight('videos')
+def fetch_movie_videos(movie_id):
+    return tmdb_client.get_json(f"/3/movie/{movie_id}/videos")
 
-    if movie.watch_providers_ids is None:
-        movie.watch_providers_ids = fetch_and_store_movie_watch_providers(movie_id, locale)
 
-    if movie.watch_providers_ids and movie.watch_providers_last_updated < datetime.now().date():
-        movie.watch_providers_ids = fetch_and_store_movie_watch_providers(movie_id, locale)
-
-    if selected_providers and not set([s[0] for s in selected_providers]).intersection(movie.watch_providers_ids):
+@single_flight('details')
+def fetch_movie_details(movie_id, client=tmdb_client):
+    # Videos, watch providers and keywords come inline with the details to avoid extra TMDB calls
+    response = client.get(f"/3/movie/{movie_id}", params={'append_to_response': 'videos,watch/providers,keywords'})
+    if response is None:
         return None
-
-    # TODO: Improve because we loose a lot of movies
-    if not movie.poster_path:
+    if response.status_code == 404:
+        print(f"🚫 Movie {movie_id} does not exist on TMDB")
+        mark_negative(NOT_FOUND, [movie_id])
         return None
-
-    if not movie.trailer_key:
-        movie.trailer_key = fetch_and_store_trailer_key(movie_id)
-
-    if movie.trailer_key and movie.trailer_key_last_updated < datetime.now().date():
-        movie.trailer_key = fetch_and_store_trailer_key(movie_id)
-
-    enriched = {
+    if response.status_code != 200:
+        print(f"⚠️ TMDB Error while fetching movie details: {response.status_code} - {response.text}")
+        return None
+    return response.json()
+
+
+def fetch_and_store_trailer_keys(movies):
+    # Returns {movie_id: MovieRecord} with the new trailers, they are written by the write buffer
+    if not movies:
+        return {}
+    today = datetime.now().date()
+    updated_movies = {}
+    for movie, videos in zip(movies, run_concurrently(fetch_movie_videos, [m.id for m in movies])):
+        if videos is None:
+            continue
+        updated_movies[movie.id] = movie._replace(trailer_key=extract_trailer_key(videos),
+                                                  trailer_key_last_updated=today)
+    write_buffer.add_trailers({movie.id: (movie.trailer_key, today) for movie in updated_movies.values()})
+    invalidate_movies([m.id for m in movies])
+    print(f"🗄️ Stored Trailer Keys for movies: {[m.id for m in movies]}")
+    return updated_movies
+
+
+def movie_fields(response_json, today):
+    # tmdb_movies columns from a TMDB movie details response appended with videos and keywords
+    return dict(
+        id=response_json.get('id'),
+        title=response_json.get('title'),
+        vote_average=response_json.get('vote_average'),
+        vote_count=response_json.get('vote_count'),
+        status=response_json.get('status'),
+        release_date=response_json.get('release_date'),
+        revenue=response_json.get('revenue'),
+        runtime=response_json.get('runtime'),
+        adult=response_json.get('adult'),
+        backdrop_path=response_json.get('backdrop_path'),
+        budget=response_json.get('budget'),
+        homepage=response_json.get('homepage'),
+        imdb_id=response_json.get('imdb_id'),
+        original_language=response_json.get('original_language'),
+        original_title=response_json.get('original_title'),
+        overview=response_json.get('overview'),
+        popularity=response_json.get('popularity'),
+        poster_path=response_json.get('poster_path'),
+        tagline=response_json.get('tagline'),
+        genres=','.join([genre['name'] for genre in response_json.get('genres', [])]),
+        production_companies=response_json.get('production_companies'),
+        production_countries=response_json.get('production_countries'),
+        spoken_languages=response_json.get('spoken_languages'),
+        keywords=response_json.get('keywords', {}).get('keywords'),
+        trailer_key=extract_trailer_key(response_json.get('videos', {})),
+        trailer_key_last_updated=today,
+    )
+
+
+def fetch_and_store_movie_details(movie_ids, locale='FR'):
+    # Details, trailer and watch providers of every region are stored together by the write buffer,
+    # returns MovieRecord
+    today = datetime.now().date()
+    movies = []
+    movies_fields = []
+    regions_providers_ids = {}
+    for response_json in run_concurrently(fetch_movie_details, movie_ids):
+        if not response_json:
+            continue
+        regions_providers_ids[response_json.get('id')] = extract_regions_providers_ids(
+            response_json.get('watch/providers', {}))
+        fields = movie_fields(response_json, today)
+        movies_fields.append(fields)
+        movies.append(TmdbMovie(**fields))
+    write_buffer.add_movies(movies_fields)
+    store_movies_availability(regions_providers_ids, locale, today)
+    content_recommender.add_movies(movies)
+    mark_negative(NO_POSTER, [m.id for m in movies if not m.poster_path])
+    invalidate_movies([m.id for m in movies])
+    print(f"🗄️ Stored Movie Details of movies: {[m.id for m in movies]}")
+    return [movie_record(fields) for fields in movies_fields]
+
+
+def fetch_and_store_movie_watch_providers(movies, locale):
+    # Stores the providers of locale and STORED_REGIONS, returns the availability of the movies in locale
+    if not movies:
+        return {}
+    today = datetime.now().date()
+    movie_ids = [m.id for m in movies]
+    regions_providers_ids = {}
+    for movie_id, watch_providers in zip(movie_ids, run_concurrently(fetch_movie_watch_providers, movie_ids)):
+        if watch_providers is not None:
+            regions_providers_ids[movie_id] = extract_regions_providers_ids(watch_providers)
+    store_movies_availability(regions_providers_ids, locale, today)
+    invalidate_movies(list(regions_providers_ids))
+    print(f"🗄️ Stored Watch Providers for movies {list(regions_providers_ids)}")
+    return {movie_id: {'provider_ids': set(regions.get(locale.upper(), [])), 'last_updated': today}
+            for movie_id, regions in regions_providers_ids.items()}
+
+
+def enrich_movie(movie):
+    return {
         "id": movie.id,
         "title": movie.title,
         "image": f"https://image.tmdb.org/t/p/w500{movie.poster_path}",
@@ -252,22 +496,114 @@ def get_movie(movie_id, selected_providers, locale='FR'):
         "overview": movie.overview,
         "trailer_key": movie.trailer_key,
         "runtime": movie.runtime if movie.runtime else 'N/A',
-        "genres": [genre.strip() for genre in movie.genres.split(',')],
+        "genres": movie.genres,
         "platforms": []
     }
 
-    return enriched
+
+def get_stored_movies(movie_ids):
+    # {movie_id: MovieRecord} of the stored movies, updated with the writes of this process not flushed yet.
+    # Only the served columns are selected, no ORM instance is built.
+    rows = db.session.execute(select(*MOVIE_RECORD_COLUMNS).where(TmdbMovie.id.in_(movie_ids)))
+    movies = {row.id: movie_record(row._mapping) for row in rows}
+    write_buffer.apply_trailers(movies)
+    movies.update(write_buffer.get_movies(movie_ids))
+    return movies
 
 
-def fetch_watch_providers():
-    url = f"{TMDB_URL}/3/watch/providers/movie?language=en-US"
+def load_movies(movie_ids, selected_providers, locale='FR'):
+    # Read movies from db, only the missing or stale ones hit TMDB. Fresh payloads are cached in Redis.
+    movies = get_stored_movies(movie_ids)
+
+    missing_ids = [movie_id for movie_id in movie_ids if movie_id not in movies]
+    # Movies without poster reaching here have an expired no_poster mark, check if TMDB has one now
+    no_poster_ids = [movie.id for movie in movies.values() if not movie.poster_path]
+    if missing_ids or no_poster_ids:
+        for movie in fetch_and_store_movie_details(missing_ids + no_poster_ids, locale):
+            movies[movie.id] = movie
+        for movie_id in missing_ids:
+            if movie_id not in movies:
+                print(f"⚠️ Error fetching movie {movie_id}")
+
+    # Only never fetched data is fetched inline, stale data is served and refreshed in background
+    availability = get_movies_availability(list(movies), locale)
+    unknown_providers = [m for m in movies.values() if m.id not in availability]
+    availability.update(fetch_and_store_movie_watch_providers(unknown_providers, locale))
+
+    selected_providers_ids = {s[0] for s in selected_providers}
+    available_movies = []
+    for movie_id in movie_ids:
+        movie = movies.get(movie_id)
+        if not movie:
+            continue
+        # A failed providers fetch means unknown, not unavailable: the movie is kept unless platforms are filtered
+        provider_ids = availability[movie_id]['provider_ids'] if movie_id in availability else None
+        if selected_providers_ids and not selected_providers_ids.intersection(provider_ids or ()):
+            continue
+        # TODO: Improve because we loose a lot of movies
+        if not movie.poster_path:
+            continue
+        available_movies.append(movie)
+
+    unknown_trailers = [m for m in available_movies if m.trailer_key_last_updated is None]
+    movies.update(fetch_and_store_trailer_keys(unknown_trailers))
+    available_movies = [movies[m.id] for m in available_movies]
+
+    today = datetime.now().date()
+    enqueue_refresh([m.id for m in movies.values()
+                     if is_stale(m, availability.get(m.id, {}).get('last_updated'), today)], locale)
+
+    entries = {}
+    cache_entries = []
+    for movie in available_movies:
+        movie_availability = availability.get(movie.id)
+        provider_ids = movie_availability['provider_ids'] if movie_availability else ()
+        entries[movie.id] = {"movie": enrich_movie(movie), "watch_providers_ids": list(provider_ids)}
+        # Movies without availability are not cached, their providers are fetched again by the next request
+        if movie_availability:
+            ttl = seconds_until_stale(trailer_stale_date(movie),
+                                      providers_stale_date(movie_availability['last_updated']))
+            cache_entries.append((movie.id, entries[movie.id], ttl))
+    cache_movies(cache_entries, locale)
+    return entries
+
+
+def get_movies(movie_ids, selected_providers, locale='FR'):
+    # Enrich a batch of movies, hot ones are served from Redis. Results keep the movie_ids order.
+    movie_ids = list(dict.fromkeys(movie_ids))
+    unusable_ids = get_unusable_movie_ids(movie_ids)
+    movie_ids = [movie_id for movie_id in movie_ids if movie_id not in unusable_ids]
+    if not movie_ids:
+        return []
+
+    entries = get_cached_movies(movie_ids, locale)
+    uncached_ids = [movie_id for movie_id in movie_ids if movie_id not in entries]
+    if uncached_ids:
+        with span('enrich'):
+            entries.update(load_movies(uncached_ids, selected_providers, locale))
+
+    selected_providers_ids = {s[0] for s in selected_providers}
+    enriched_movies = []
+    for movie_id in movie_ids:
+        entry = entries.get(movie_id)
+        if not entry:
+            continue
+        if selected_providers_ids and not selected_providers_ids.intersection(entry['watch_providers_ids']):
+            continue
+        enriched_movies.append(entry['movie'])
+    return enriched_movies
+
 
-    response = requests.get(url, headers=HEADERS)
-    if response.status_code == 200:
-        return response.json().get("results", [])
-    else:
-        print(f"⚠️ TMDB Error while fetching providers: {response.status_code} - {response.text}")
+def get_movie(movie_id, selected_providers, locale='FR'):
+    movies = get_movies([movie_id], selected_providers, locale)
+    return movies[0] if movies else None
+
+
+def fetch_watch_providers():
+    providers_json = tmdb_client.get_json("/3/watch/providers/movie", params={'language': 'en-US'})
+    if providers_json is None:
         return []
+    return providers_json.get("results", [])
 
 
 def store_watch_providers():
@@ -281,4 +617,5 @@ def store_watch_providers():
                 session.add(new_provider)
 
         session.commit()
+    provider_registry.reload()
     print(f"✅ {len(providers)} watch providers stored in db.")
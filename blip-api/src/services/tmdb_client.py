@@ -0,0 +1,147 @@
+import os
+import random
+import re
+import time
+
+import redis
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.app import redis_client
+from src.services.deadline import bounded_timeout, can_wait
+from src.services.metrics import count, record_span
+
+TMDB_URL = os.getenv('TMDB_URL')
+TMDB_BEARER_TOKEN = os.getenv('TMDB_BEARER_TOKEN')
+TMDB_TIMEOUT = float(os.getenv('TMDB_TIMEOUT', 5))
+TMDB_MAX_RETRIES = int(os.getenv('TMDB_MAX_RETRIES', 3))
+TMDB_RETRY_BACKOFF = float(os.getenv('TMDB_RETRY_BACKOFF', 0.5))
+# Requests per second shared by every process, TMDB allows around 50
+TMDB_RATE_LIMIT = float(os.getenv('TMDB_RATE_LIMIT', 40))
+TMDB_POOL_SIZE = int(os.getenv('TMDB_POOL_SIZE', 16))
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+RATE_LIMIT_KEY = 'tmdb_rate_limit'
+
+# Token bucket refilled at `rate` tokens per second, returns how long to wait before a token is available
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'timestamp')
+local tokens = tonumber(bucket[1]) or capacity
+local timestamp = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - timestamp) * rate)
+local wait = 0
+if tokens < 1 then
+    wait = (1 - tokens) / rate
+else
+    tokens = tokens - 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'timestamp', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+def tmdb_endpoint(path):
+    # Metric label and cache TTL lookup key of a TMDB path: ids are replaced by {id}, the API version /3 stays
+    return re.sub(r'(?<=[a-z])/\d+', '/{id}', path)
+
+
+class TmdbClient:
+    # rate_limits: (Redis key, requests per second) of the token buckets, each call takes a token from all of them
+    def __init__(self, base_url, bearer_token, redis_client, rate_limits=((RATE_LIMIT_KEY, TMDB_RATE_LIMIT),),
+                 timeout=TMDB_TIMEOUT, max_retries=TMDB_MAX_RETRIES, pool_size=TMDB_POOL_SIZE):
+        self.base_url = base_url
+        self.redis_client = redis_client
+        self.rate_limits = rate_limits
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+        # Keep-alive connections shared by every thread of the process
+        self.session = requests.Session()
+        self.session.headers.update({'Authorization': f"Bearer {bearer_token}"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.token_bucket = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def get(self, path, params=None, timeout=None):
+        # Returns the last response received, or None when TMDB could not be reached at all.
+        # Waits, retries and the timeout of each call are bounded by the deadline of the request.
+        endpoint = tmdb_endpoint(path)
+        response = None
+        for attempt in range(self.max_retries + 1):
+            if attempt and not self.wait_before_retry(attempt, response):
+                break
+            call_timeout = bounded_timeout(timeout or self.timeout) if self.acquire_token() else 0
+            if call_timeout <= 0:
+                count('tmdb_deadline_skips', endpoint=endpoint)
+                print(f"⏱️ TMDB call skipped, request deadline exceeded: {endpoint}")
+                break
+
+            start = time.monotonic()
+            try:
+                response = self.session.get(f"{self.base_url}{path}", params=params, timeout=call_timeout)
+            except requests.RequestException as e:
+                self.record(endpoint, time.monotonic() - start, error=True)
+                print(f"⚠️ TMDB request failed: {endpoint} - {e}")
+                response = None
+                continue
+
+            self.record(endpoint, time.monotonic() - start, error=response.status_code != 200)
+            if response.status_code not in RETRY_STATUS_CODES:
+                return response
+            print(f"⚠️ TMDB {response.status_code} on {endpoint}, attempt {attempt + 1}/{self.max_retries + 1}")
+
+        return response
+
+    def get_json(self, path, params=None, timeout=None):
+        response = self.get(path, params=params, timeout=timeout)
+        if response is None:
+            return None
+        if response.status_code != 200:
+            print(f"⚠️ TMDB Error on {path}: {response.status_code} - {response.text}")
+            return None
+        return response.json()
+
+    def wait_before_retry(self, attempt, response):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            # Exponential backoff with full jitter so workers don't retry in lockstep
+            delay = random.uniform(0, TMDB_RETRY_BACKOFF * 2 ** (attempt - 1))
+        if not can_wait(delay):
+            return False
+        time.sleep(delay)
+        return True
+
+    def acquire_token(self):
+        # False when a token comes too late for the deadline of the request
+        return all(self.acquire_bucket_token(key, rate) for key, rate in self.rate_limits)
+
+    def acquire_bucket_token(self, key, rate):
+        while True:
+            try:
+                wait = float(self.token_bucket(keys=[key], args=[rate, rate]))
+            except redis.RedisError:
+                # Never block TMDB calls because Redis is down
+                return True
+            if wait <= 0:
+                return True
+            if not can_wait(wait):
+                return False
+            time.sleep(wait)
+
+    def record(self, endpoint, latency, error=False):
+        record_span('tmdb', latency, endpoint=endpoint)
+        count('tmdb_calls', endpoint=endpoint)
+        if error:
+            count('tmdb_errors', endpoint=endpoint)
+
+
+tmdb_client = TmdbClient(TMDB_URL, TMDB_BEARER_TOKEN, redis_client)
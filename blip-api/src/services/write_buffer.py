@@ -0,0 +1,211 @@
+import atexit
+import os
+import threading
+import time
+
+from sqlalchemy import delete, insert, update, bindparam, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.database import db
+from src.database.models import TmdbMovie, MovieWatchProvider
+from src.services.metrics import count
+from src.services.movie_records import movie_record
+
+WRITE_BEHIND_FLUSH_SECONDS = float(os.getenv('WRITE_BEHIND_FLUSH_SECONDS', 2))
+# A request leaving more pending movies than this flushes them itself instead of waiting for the timer
+WRITE_BEHIND_MAX_PENDING = int(os.getenv('WRITE_BEHIND_MAX_PENDING', 200))
+
+
+def empty_writes():
+    # movies: {movie_id: fields}, trailers: {movie_id: (trailer_key, last_updated)},
+    # availability: {movie_id: rows of the regions replaced}
+    return {'movies': {}, 'trailers': {}, 'availability': {}}
+
+
+def write_movies(connection, writes):
+    # Ids are written in order so that concurrent flushes lock the same rows in the same order
+    movies = [writes['movies'][movie_id] for movie_id in sorted(writes['movies'])]
+    if movies:
+        statement = pg_insert(TmdbMovie).values(movies)
+        # Another worker may have inserted the same movie meanwhile, the latest details win
+        statement = statement.on_conflict_do_update(
+            index_elements=[TmdbMovie.id],
+            set_={column: statement.excluded[column] for column in movies[0] if column != 'id'})
+        connection.execute(statement)
+
+    trailers = [{'movie_id': movie_id, 'trailer_key': trailer_key, 'last_updated': last_updated}
+                for movie_id, (trailer_key, last_updated) in sorted(writes['trailers'].items())]
+    if trailers:
+        connection.execute(update(TmdbMovie.__table__)
+                           .where(TmdbMovie.__table__.c.id == bindparam('movie_id'))
+                           .values(trailer_key=bindparam('trailer_key'),
+                                   trailer_key_last_updated=bindparam('last_updated')),
+                           trailers)
+
+    availability = writes['availability']
+    if availability:
+        rows = [row for movie_id in sorted(availability) for row in availability[movie_id]]
+        # Only the regions written are replaced, the other stored regions of these movies are kept
+        movie_regions = sorted({(row['movie_id'], row['region']) for row in rows})
+        connection.execute(delete(MovieWatchProvider)
+                           .where(tuple_(MovieWatchProvider.movie_id, MovieWatchProvider.region).in_(movie_regions)))
+        connection.execute(insert(MovieWatchProvider), rows)
+
+
+def writes_by_movie(writes):
+    # (movie_id, the writes of this movie only), in id order
+    for movie_id in sorted(set().union(*writes.values())):
+        movie_writes = empty_writes()
+        for kind, values in writes.items():
+            if movie_id in values:
+                movie_writes[kind][movie_id] = values[movie_id]
+        yield movie_id, movie_writes
+
+
+def write_movies_one_by_one(writes):
+    # One transaction per movie, a bad row only loses the writes of its own movie. Returns the failed ids.
+    failed_ids = []
+    for movie_id, movie_writes in writes_by_movie(writes):
+        try:
+            with db.engine.begin() as connection:
+                write_movies(connection, movie_writes)
+        except SQLAlchemyError as e:
+            print(f"⚠️ Database error while writing movie {movie_id}: {e}")
+            failed_ids.append(movie_id)
+    return failed_ids
+
+
+class WriteBuffer:
+    # Movie details, trailer keys and watch providers fetched while serving requests are collected here and
+    # written in a few bulk statements, at the end of a busy request or every WRITE_BEHIND_FLUSH_SECONDS.
+    # Reads of this process see the pending writes through get_movies / apply_trailers / get_availability.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.pending = empty_writes()
+        # Writes being flushed stay visible until they are committed
+        self.flushing = empty_writes()
+        self.app = None
+        self.timer = None
+
+    def init_app(self, app):
+        self.app = app
+        app.teardown_request(self.flush_if_full)
+        atexit.register(self.flush)
+
+    def start_timer(self):
+        def run():
+            while True:
+                time.sleep(WRITE_BEHIND_FLUSH_SECONDS)
+                try:
+                    self.flush()
+                except Exception as e:
+                    # The timer must outlive any error, pending writes would only be flushed by busy requests
+                    print(f"⚠️ Write buffer flush failed: {e}")
+
+        self.timer = threading.Thread(target=run, daemon=True)
+        self.timer.start()
+
+    def add_movies(self, movies_fields):
+        with self.lock:
+            for fields in movies_fields:
+                self.pending['movies'][fields['id']] = fields
+                # The new details carry their own trailer
+                self.pending['trailers'].pop(fields['id'], None)
+            if self.timer is None:
+                self.start_timer()
+
+    def add_trailers(self, trailers):
+        # trailers: {movie_id: (trailer_key, last_updated)}
+        with self.lock:
+            for movie_id, (trailer_key, last_updated) in trailers.items():
+                fields = self.pending['movies'].get(movie_id)
+                if fields is not None:
+                    fields.update(trailer_key=trailer_key, trailer_key_last_updated=last_updated)
+                else:
+                    self.pending['trailers'][movie_id] = (trailer_key, last_updated)
+            if self.timer is None:
+                self.start_timer()
+
+    def add_availability(self, rows_by_movie_id):
+        # rows_by_movie_id: {movie_id: [movie_watch_provider row]}, replaces the regions of these rows
+        with self.lock:
+            self.pending['availability'].update(rows_by_movie_id)
+            if self.timer is None:
+                self.start_timer()
+
+    def get_movies(self, movie_ids):
+        # Movies stored by this process but not flushed yet, as MovieRecord
+        with self.lock:
+            movies = {}
+            for writes in (self.flushing, self.pending):
+                for movie_id in movie_ids:
+                    if movie_id in writes['movies']:
+                        movies[movie_id] = movie_record(writes['movies'][movie_id])
+        self.apply_trailers(movies)
+        return movies
+
+    def apply_trailers(self, movies):
+        # movies: {movie_id: MovieRecord}, records with a pending trailer are replaced
+        with self.lock:
+            for writes in (self.flushing, self.pending):
+                for movie_id, movie in movies.items():
+                    if movie_id in writes['trailers']:
+                        trailer_key, last_updated = writes['trailers'][movie_id]
+                        movies[movie_id] = movie._replace(trailer_key=trailer_key,
+                                                          trailer_key_last_updated=last_updated)
+
+    def get_availability(self, movie_ids, region):
+        # Same format as availability.get_movies_availability
+        availability = {}
+        with self.lock:
+            for writes in (self.flushing, self.pending):
+                for movie_id in movie_ids:
+                    rows = [row for row in writes['availability'].get(movie_id, []) if row['region'] == region.upper()]
+                    if rows:
+                        availability[movie_id] = {
+                            'provider_ids': {row['provider_id'] for row in rows if row['provider_id'] is not None},
+                            'last_updated': rows[0]['last_updated']}
+        return availability
+
+    def pending_count(self):
+        with self.lock:
+            return len(set().union(*self.pending.values()))
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                writes, self.pending = self.pending, empty_writes()
+                self.flushing = writes
+            try:
+                if any(writes.values()):
+                    with self.app.app_context():
+                        self.write(writes)
+            finally:
+                with self.lock:
+                    self.flushing = empty_writes()
+
+    def write(self, writes):
+        start = time.time()
+        try:
+            with db.engine.begin() as connection:
+                write_movies(connection, writes)
+        except SQLAlchemyError as e:
+            # One bad row rolls back the whole batch, the other movies are written on their own
+            print(f"⚠️ Database error while flushing writes, writing them one movie at a time: {e}")
+            failed_ids = write_movies_one_by_one(writes)
+            if failed_ids:
+                # Nothing is lost for good, the movies are fetched again when they are missing or stale
+                count('write_buffer_dropped_movies', len(failed_ids))
+                print(f"⚠️ Dropped the writes of {len(failed_ids)} movies: {failed_ids}")
+            return
+        print(f"🗄️ Flushed {len(writes['movies'])} movies, {len(writes['trailers'])} trailers and "
+              f"{len(writes['availability'])} availabilities in {time.time() - start:.2f}s")
+
+    def flush_if_full(self, exception=None):
+        if self.pending_count() >= WRITE_BEHIND_MAX_PENDING:
+            self.flush()
+
+
+write_buffer = WriteBuffer()
@@ -1,2 +1,8 @@
-def extract_trailer_key(trailer_response):
-    return next((trailer['key'] for trailer in trailer_response.json()['results'] if trailer['type'] == 'Trailer'), None)
\ No newline at end of file
+def extract_trailer_key(videos):
+    return next((trailer['key'] for trailer in videos.get('results', []) if trailer['type'] == 'Trailer'), None)
+
+
+def extract_regions_providers_ids(watch_providers):
+    # Flatrate providers of every region TMDB knows for a movie
+    return {region: [p['provider_id'] for p in providers.get('flatrate', [])]
+            for region, providers in watch_providers.get('results', {}).items()}